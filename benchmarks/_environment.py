@@ -0,0 +1,83 @@
+"""
+_environment.py
+
+Temporary environment for the benchmarks that import modules of knightbot/src
+which read resources/env at import time, and the guild payloads the discord.py
+benchmarks build their caches from
+"""
+
+import contextlib
+import json
+import os
+import sys
+import tempfile
+
+@contextlib.contextmanager
+def environment () -> str:
+    """
+    Creates env.json and prefix.json in a temporary directory, makes knightbot/src
+    importable and runs the benchmark from there, yields the directory
+
+    The modules read the environment relative to the working directory, so the
+    working directory is restored and the directory removed on exit
+    """
+
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'resources', 'env'))
+        os.makedirs(os.path.join(directory, 'run'))
+
+        with open(os.path.join(directory, 'resources', 'env', 'env.json'), 'w') as f:
+            json.dump({'token': '', 'name': 'Knight', 'owner': '0', 'support': ''}, f)
+        with open(os.path.join(directory, 'resources', 'env', 'prefix.json'), 'w') as f:
+            json.dump({'default_prefix': '!', 'custom_prefix': {}}, f)
+
+        sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src')))
+        os.chdir(os.path.join(directory, 'run'))
+
+        try:
+            yield directory
+        finally:
+            os.chdir(cwd)
+
+def guild_payload (guild_id: int, channels: int, roles: int = 1, user_ids: [int] = (), members: bool = False,
+                   presences: bool = False) -> dict:
+    """
+    Returns a GUILD_CREATE payload of a guild with text channels and roles,
+    and with members and presences as Discord sends them when the intents ask
+    for them, as after chunking
+
+    The @everyone role has the ID of the guild, the channels the IDs that
+    follow it and the other roles the IDs after those. Members get one of the
+    other roles each
+    """
+
+    role_ids = [guild_id + 1 + channels + role for role in range(roles - 1)]
+
+    data = {
+        'id'          : str(guild_id),
+        'name'        : f'Guild {guild_id}',
+        'member_count': len(user_ids),
+        'roles'       : [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0}] +
+                        [{'id': str(role_id), 'name': f'Role {position}', 'permissions': '0', 'position': position}
+                         for position, role_id in enumerate(role_ids, 1)],
+        'channels'    : [{'id': str(guild_id + 1 + channel), 'type': 0, 'name': f'channel-{channel}', 'position': channel}
+                         for channel in range(channels)],
+        'emojis'      : [],
+        'features'    : []
+    }
+
+    if members:
+        data['members'] = [{'user'     : {'id': str(user_id), 'username': f'user{user_id}', 'discriminator': '0001', 'avatar': None},
+                            'roles'    : [str(role_ids[user_id % len(role_ids)])] if len(role_ids) > 0 else [],
+                            'joined_at': '2021-01-01T00:00:00+00:00',
+                            'deaf'     : False,
+                            'mute'     : False}
+                           for user_id in user_ids]
+
+    if presences:
+        data['presences'] = [{'user': {'id': str(user_id)}, 'status': 'online', 'activities': [], 'client_status': {'desktop': 'online'}}
+                             for user_id in user_ids[::3]]
+
+    return data
@@ -0,0 +1,91 @@
+"""
+automod.py
+
+Cost per message of the automod matcher as a guild's lists grow to 10k terms
+
+Compares TermMatcher, the Aho-Corasick automaton the Moderation cog uses,
+against one combined regex of every term, on chat messages of 20 to 300
+characters that contain no term, the case of nearly every message. Also
+times adding one term to a 10k term list with TermMatcher.edited(), as the
+cog does on an executor thread, against building the matcher from scratch
+
+Run from the repository root: python benchmarks/automod.py
+"""
+
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src'))
+
+from automod import (
+    TermMatcher
+)
+
+SIZES    = (10, 100, 1_000, 10_000)
+MESSAGES = 1_000
+
+def random_word (low: int, high: int) -> str:
+    return ''.join(random.choice(string.ascii_lowercase) for _ in range(random.randint(low, high)))
+
+def main () -> None:
+    random.seed(0)
+
+    # Terms are 5 to 10 letters, the chat vocabulary 1 to 8, so a few chat words
+    # share prefixes with terms without matching them
+    terms    = list(dict.fromkeys(random_word(5, 10) for _ in range(SIZES[-1] * 2)))[:SIZES[-1]]
+    blocked  = set(terms)
+    chat     = [word for word in (random_word(1, 8) for _ in range(5_000)) if word not in blocked]
+    messages = []
+
+    for _ in range(MESSAGES):
+        message = []
+        length  = random.randint(20, 300)
+        while sum(len(word) + 1 for word in message) < length:
+            message.append(random.choice(chat))
+        messages.append(' '.join(message))
+
+    characters = sum(len(message) for message in messages)
+
+    print(f'{MESSAGES} messages, {characters / MESSAGES:.0f} characters on average, no matches')
+    print(f'  {"terms":>6}  {"TermMatcher":>14}  {"combined regex":>16}')
+
+    for size in SIZES:
+        words   = terms[:size // 2]
+        phrases = terms[size // 2:size]
+
+        matcher = TermMatcher(words, phrases)
+
+        pattern = re.compile('|'.join([r'\b' + re.escape(word) + r'\b' for word in words] + [re.escape(phrase) for phrase in phrases]),
+                             re.IGNORECASE)
+
+        start = time.perf_counter()
+        for message in messages:
+            assert matcher.find(message) is None
+        automaton = (time.perf_counter() - start) / MESSAGES
+
+        start = time.perf_counter()
+        for message in messages:
+            assert pattern.search(message) is None
+        combined = (time.perf_counter() - start) / MESSAGES
+
+        print(f'  {size:>6}  {automaton * 1e6:>11.1f} us  {combined * 1e6:>13.1f} us')
+
+    words   = terms[:SIZES[-1] // 2]
+    phrases = terms[SIZES[-1] // 2:]
+
+    start   = time.perf_counter()
+    matcher = TermMatcher(words, phrases)
+    built   = time.perf_counter() - start
+
+    start  = time.perf_counter()
+    matcher.edited(words + [random_word(11, 11)], phrases)
+    edited = time.perf_counter() - start
+
+    print(f'{SIZES[-1]} terms: built in {built * 1e3:.1f} ms, edited copy with one term added in {edited * 1e3:.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+cache_storage.py
+
+Write latency of a single admin.json change with JSON and SQLite storage
+
+A guild join or removal changes one entry; JSONStorage rewrites the whole file
+while SQLiteStorage upserts one row. Both are measured at 10k and 100k guilds
+
+Run from the repository root: python benchmarks/cache_storage.py
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src'))
+
+from persistence import (
+    atomic_write_json
+)
+from storage import (
+    CacheTable,
+    JSONStorage,
+    SQLiteStorage
+)
+
+WRITES = 50
+
+def entry () -> dict:
+    return {'admin': str(random.getrandbits(62)), 'log': str(random.getrandbits(62))}
+
+def measure (table: CacheTable, storage) -> [float]:
+    timings = []
+
+    for _ in range(WRITES):
+        start = time.perf_counter()
+        table[str(random.getrandbits(62))] = entry()
+        storage.flush()
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+def run (guilds: int) -> None:
+    content = {str(random.getrandbits(62)): entry() for _ in range(guilds)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, 'admin.json')
+        atomic_write_json(json_file, content)
+
+        json_storage = JSONStorage(directory)
+        json_timings = measure(CacheTable('admin.json', json_storage), json_storage)
+
+        sqlite_storage = SQLiteStorage(os.path.join(directory, 'cache.sqlite3'))
+        start = time.perf_counter()
+        sqlite_storage.migrate('admin.json', json_file)
+        migration = time.perf_counter() - start
+
+        sqlite_timings = measure(CacheTable('admin.json', sqlite_storage), sqlite_storage)
+        sqlite_storage.close()
+
+    print(f'{guilds:>7} guilds | json {statistics.median(json_timings) * 1e3:8.3f} ms/write '
+          f'| sqlite {statistics.median(sqlite_timings) * 1e3:8.3f} ms/write '
+          f'| migration {migration * 1e3:8.1f} ms')
+
+if __name__ == '__main__':
+    random.seed(0)
+    for count in (10_000, 100_000):
+        run(count)
@@ -0,0 +1,79 @@
+"""
+case_store.py
+
+Cost of the case, history and modstats lookups of CaseStore for a guild with
+200k cases among 10 guilds of 1M cases in total
+
+Cases are added in batches as massban records them. Every lookup is timed
+over random guilds, numbers and users of the largest guild
+
+Run from the repository root: python benchmarks/case_store.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src'))
+
+from cases import (
+    CaseStore
+)
+
+GUILDS     = 10
+CASES      = 1_000_000
+LARGEST    = 200_000
+USERS      = 50_000
+MODERATORS = 20
+BATCH      = 100
+LOOKUPS    = 1_000
+
+def main () -> None:
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = CaseStore(os.path.join(directory, 'cases.sqlite3'))
+
+        # The first guild gets LARGEST cases, the others share the rest
+        sizes = [LARGEST] + [(CASES - LARGEST) // (GUILDS - 1)] * (GUILDS - 1)
+
+        start = time.perf_counter()
+        for guild_id, size in enumerate(sizes):
+            for _ in range(0, size, BATCH):
+                store.add(guild_id, random.choice(('kick', 'ban')), [random.randrange(USERS) for _ in range(BATCH)],
+                          random.randrange(MODERATORS), 'benchmark')
+        added = time.perf_counter() - start
+
+        timings = {}
+
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            assert store.get(0, random.randint(1, LARGEST)) is not None
+        timings['case <id>'] = (time.perf_counter() - start) / LOOKUPS
+
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            store.history(0, random.randrange(USERS))
+        timings['history <user>'] = (time.perf_counter() - start) / LOOKUPS
+
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            store.history(0, random.randrange(USERS), offset = 10)
+        timings['history <user> 2'] = (time.perf_counter() - start) / LOOKUPS
+
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            store.stats(0)
+        timings['modstats'] = (time.perf_counter() - start) / LOOKUPS
+
+        store.close()
+
+        print(f'{CASES} cases in {GUILDS} guilds, {LARGEST} in the largest, added in {added:.1f} s '
+              f'({added / CASES * 1e6:.1f} us/case in batches of {BATCH})')
+        for name, seconds in timings.items():
+            print(f'  {name:<17}: {seconds * 1e3:8.3f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+channel_lookup.py
+
+Cost of resolving log channels in ChannelLogger with 5k guilds of 50 channels
+
+Compares the previous lookup, utils.get over Client.get_all_channels, against
+ChannelLogger's lookup through the guild of the channel, for single lookups
+and for a broadcast to the log channel of every guild
+
+Requires discord.py. Run from the repository root: python benchmarks/channel_lookup.py
+"""
+
+import asyncio
+import random
+import time
+
+from _environment import (
+    environment,
+    guild_payload
+)
+
+GUILDS   = 5_000
+CHANNELS = 50
+LOOKUPS  = 200
+
+def run () -> None:
+    from discord import (
+        Client,
+        Intents,
+        utils
+    )
+    from logger import (
+        ChannelLogger
+    )
+
+    client = Client(intents = Intents.none())
+    for guild_id in range(1, GUILDS + 1):
+        client._connection._get_create_guild(guild_payload(guild_id << 22, CHANNELS))
+
+    channel_logger = ChannelLogger(client)
+
+    # The log channel is the last channel of a guild
+    random.seed(0)
+    targets = [(guild_id << 22, (guild_id << 22) + CHANNELS) for guild_id in random.sample(range(1, GUILDS + 1), LOOKUPS)]
+
+    start = time.perf_counter()
+    for _, channel_id in targets:
+        assert utils.get(client.get_all_channels(), id = channel_id) is not None
+    legacy = (time.perf_counter() - start) / LOOKUPS
+
+    start = time.perf_counter()
+    for guild_id, channel_id in targets:
+        assert channel_logger._resolve(channel_id, guild_id) is not None
+    indexed = (time.perf_counter() - start) / LOOKUPS
+
+    start = time.perf_counter()
+    for guild in client.guilds:
+        channel_logger._resolve(guild.id + CHANNELS, guild.id)
+    broadcast = time.perf_counter() - start
+
+    # Client.get_channel on the first lookup, the kept reference afterwards
+    start = time.perf_counter()
+    for _, channel_id in targets:
+        assert channel_logger._resolve(channel_id) is not None
+    first = (time.perf_counter() - start) / LOOKUPS
+
+    start = time.perf_counter()
+    for _, channel_id in targets:
+        assert channel_logger._resolve(channel_id) is not None
+    kept = (time.perf_counter() - start) / LOOKUPS
+
+    print(f'{GUILDS} guilds, {CHANNELS} channels each')
+    print(f'  utils.get(get_all_channels()) : {legacy * 1e6:12.1f} us/lookup, {legacy * GUILDS:8.2f} s per broadcast')
+    print(f'  guild.get_channel             : {indexed * 1e6:12.2f} us/lookup, {broadcast * 1e3:8.2f} ms per broadcast')
+    print(f'  no guild, first lookup        : {first * 1e6:12.2f} us/lookup')
+    print(f'  no guild, kept reference      : {kept * 1e6:12.2f} us/lookup')
+
+def main () -> None:
+    with environment():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+file_logger.py
+
+Lines per second written by FileLogger
+
+Compares the previous FileLogger.log, which opened, wrote and closed the log
+file for every line on the event loop, against the queued, batched FileLogger
+
+Requires discord.py. Run from the repository root: python benchmarks/file_logger.py
+"""
+
+import asyncio
+import os
+import time
+
+from _environment import (
+    environment
+)
+
+LINES = 50_000
+
+def legacy_log (pretty, file: str, category, message: str) -> None:
+    """The previous FileLogger.log body"""
+
+    with open(file, 'a', encoding = 'utf-8') as f:
+        print(pretty(category, message), file = f)
+
+async def run (directory: str) -> None:
+    from logger import (
+        INFO,
+        FileLogger
+    )
+
+    legacy_file = os.path.join(directory, 'legacy.txt')
+
+    start = time.perf_counter()
+    for index in range(LINES):
+        legacy_log(FileLogger.pretty, legacy_file, INFO, f'Message {index}')
+    legacy = time.perf_counter() - start
+
+    logger = FileLogger(None, os.path.join(directory, 'queued.txt'), flush_interval = 0.05)
+
+    start = time.perf_counter()
+    for index in range(LINES):
+        await logger.log(INFO, f'Message {index}')
+    enqueued = time.perf_counter() - start
+    await logger.close()
+    queued = time.perf_counter() - start
+
+    print(f'{LINES} lines')
+    print(f'  open/write/close per line : {LINES / legacy:10.0f} lines/s')
+    print(f'  queued, batched           : {LINES / queued:10.0f} lines/s ({enqueued / LINES * 1e6:.2f} us per log call on the loop)')
+
+def main () -> None:
+    with environment() as directory:
+        asyncio.run(run(directory))
+
+if __name__ == '__main__':
+    main()
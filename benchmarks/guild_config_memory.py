@@ -0,0 +1,53 @@
+"""
+guild_config_memory.py
+
+Memory held by the guild settings of 100k guilds
+
+Compares the previous layout of admin.json in memory, a dict of dicts of
+string IDs keyed by string guild IDs, against GuildConfig records keyed by int
+
+Run from the repository root: python benchmarks/guild_config_memory.py
+"""
+
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src'))
+
+from guildconfig import (
+    GuildConfig
+)
+
+GUILDS = 100_000
+
+def measure (build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del value
+    return size
+
+def main () -> None:
+    random.seed(0)
+    ids = [(random.getrandbits(62), random.getrandbits(62), random.getrandbits(62)) for _ in range(GUILDS)]
+
+    def legacy () -> dict:
+        return {str(guild_id): {'admin': str(admin), 'log': str(log)} for guild_id, admin, log in ids}
+
+    def records () -> dict:
+        return {guild_id: GuildConfig(guild_id, admin, log) for guild_id, admin, log in ids}
+
+    legacy_size  = measure(legacy)
+    records_size = measure(records)
+
+    print(f'{GUILDS} guilds')
+    print(f'  dict of string dicts : {legacy_size / 2 ** 20:7.2f} MiB ({legacy_size / GUILDS:6.1f} B/guild)')
+    print(f'  GuildConfig records  : {records_size / 2 ** 20:7.2f} MiB ({records_size / GUILDS:6.1f} B/guild)')
+
+if __name__ == '__main__':
+    main()
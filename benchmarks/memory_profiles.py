@@ -0,0 +1,87 @@
+"""
+memory_profiles.py
+
+Startup time and memory of the memory profiles against a simulated guild set
+
+Every profile runs in its own process. GUILD_CREATE payloads are built the way
+Discord sends them for the profile's intents (members and presences only when
+the intents ask for them, as after chunking) and are fed to discord.py's
+ConnectionState, which builds the guild, channel, role and member cache
+
+Requires discord.py. Run from the repository root: python benchmarks/memory_profiles.py
+"""
+
+import asyncio
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from _environment import (
+    guild_payload
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src'))
+
+GUILDS   = 1_000
+MEMBERS  = 250
+CHANNELS = 30
+ROLES    = 15
+USERS    = 100_000
+
+def run_profile (profile: str) -> None:
+    from discord.state import (
+        ConnectionState
+    )
+    from profiles import (
+        client_options
+    )
+
+    options = client_options(profile)
+    options['chunk_guilds_at_startup'] = False
+
+    loop = asyncio.new_event_loop()
+
+    def new_state () -> ConnectionState:
+        return ConnectionState(dispatch = lambda *args: None, handlers = {}, hooks = {}, syncer = None, http = None, loop = loop, **options)
+
+    random.seed(0)
+    intents  = options['intents']
+    payloads = [guild_payload(guild_id << 22, CHANNELS, ROLES, random.sample(range(1, USERS), MEMBERS), intents.members, intents.presences)
+                for guild_id in range(1, GUILDS + 1)]
+
+    # Timed without tracemalloc, which slows allocations down
+    state = new_state()
+    start = time.perf_counter()
+    for payload in payloads:
+        state._get_create_guild(payload)
+    elapsed = time.perf_counter() - start
+    del state
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+
+    state = new_state()
+    for payload in payloads:
+        state._get_create_guild(payload)
+
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del payloads
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    members = sum(len(guild.members) for guild in state.guilds)
+    print(f'{profile:>5} | {elapsed * 1e3:8.1f} ms | cache {traced / 2 ** 20:8.1f} MiB '
+          f'| peak RSS +{(rss_after - rss_before) / 1024:7.1f} MiB | {members} cached members')
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run_profile(sys.argv[1])
+    else:
+        print(f'{GUILDS} guilds, {MEMBERS} members and {CHANNELS} channels each')
+        for name in ('full', 'low'):
+            subprocess.run([sys.executable, __file__, name], check = True)
@@ -0,0 +1,130 @@
+"""
+message_store.py
+
+Memory held per 100k cached messages
+
+Compares discord.py Message objects, which its own message cache holds,
+against MessageStore records with plain and with compressed content. Message
+content follows a mix of short chat lines, paragraphs and long posts
+
+Requires discord.py. Run from the repository root: python benchmarks/message_store.py
+"""
+
+import gc
+import random
+import time
+import tracemalloc
+
+from _environment import (
+    environment,
+    guild_payload
+)
+
+MESSAGES = 100_000
+CHANNELS = 200
+CHUNK    = 1_000
+
+WORDS = ('the raid is over ban them all please check the logs again later this channel is for memes only '
+         'anyone up for a game tonight lol gg welcome to the server read the rules first').split()
+
+def content (rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.70:
+        words = rng.randint(2, 15)
+    elif roll < 0.95:
+        words = rng.randint(30, 90)
+    else:
+        words = rng.randint(150, 350)
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def payloads (rng: random.Random, channel_ids: [int]):
+    for index in range(MESSAGES):
+        author = 1000 + rng.randrange(5000)
+        yield channel_ids[index % len(channel_ids)], {
+            'id'              : str((1 << 40) + index),
+            'channel_id'      : str(channel_ids[index % len(channel_ids)]),
+            'author'          : {'id': str(author), 'username': f'user{author}', 'discriminator': '0001', 'avatar': None},
+            'content'         : content(rng),
+            'timestamp'       : '2021-06-01T12:00:00.000000+00:00',
+            'edited_timestamp': None,
+            'tts'             : False,
+            'mention_everyone': False,
+            'mentions'        : [],
+            'mention_roles'   : [],
+            'attachments'     : [],
+            'embeds'          : [],
+            'pinned'          : False,
+            'type'            : 0
+        }
+
+def run () -> None:
+    from discord import (
+        Client,
+        Intents,
+        Message
+    )
+    from messagestore import (
+        MessageStore
+    )
+
+    client = Client(intents = Intents.none())
+    state  = client._connection
+    guild  = state._get_create_guild(guild_payload(1 << 22, CHANNELS))
+    channels = {channel.id: channel for channel in guild.text_channels}
+
+    def messages ():
+        rng   = random.Random(0)
+        chunk = []
+        for channel_id, payload in payloads(rng, list(channels)):
+            chunk.append(Message(state = state, channel = channels[channel_id], data = payload))
+            if len(chunk) == CHUNK:
+                yield chunk
+                chunk = []
+
+    def measure (keep) -> (float, float):
+        # Timed without tracemalloc, which slows allocations down
+        kept    = keep()
+        elapsed = 0.0
+        for chunk in messages():
+            start    = time.perf_counter()
+            kept(chunk)
+            elapsed += time.perf_counter() - start
+        del kept, chunk
+
+        gc.collect()
+        tracemalloc.start()
+        kept = keep()
+        for chunk in messages():
+            kept(chunk)
+        del chunk
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return size, elapsed
+
+    def discord_cache ():
+        held = []
+        return held.extend
+
+    results = [('discord.py Message objects', *measure(discord_cache))]
+    stores  = []
+
+    for name, compress_above in (('MessageStore, plain', None), ('MessageStore, compressed', 128)):
+        def store (compress_above = compress_above):
+            stores.append(MessageStore(1 << 40, per_channel = MESSAGES, compress_above = compress_above))
+            return lambda chunk: [stores[-1].add(message) for message in chunk]
+        results.append((name, *measure(store)))
+
+    print(f'{MESSAGES} messages in {CHANNELS} channels')
+    for name, size, elapsed in results:
+        print(f'  {name:<27}: {size / 2 ** 20:7.1f} MiB per 100k, {elapsed / MESSAGES * 1e6:5.2f} us per message kept')
+    for (name, size, _), store in zip(results[1:], stores[1::2]):
+        print(f'  {name:<27}: estimated size {store.size / 2 ** 20:7.1f} MiB, the budget max_bytes is checked against')
+
+def main () -> None:
+    with environment():
+        run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+prefix_resolver.py
+
+Per-message cost of resolving command prefixes
+
+Simulates one minute of traffic (100k messages) spread over thousands of guilds
+and compares the previous per-message prefix construction against PrefixResolver
+
+Run from the repository root: python benchmarks/prefix_resolver.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src'))
+
+from prefix import (
+    PrefixResolver
+)
+
+USER_ID  = 850038547052281876
+MESSAGES = 100_000
+
+def legacy_resolve (custom_prefix: dict, default_prefix: str, guild_id: int) -> [str]:
+    """The previous _command_prefix_callback body"""
+
+    prefixes = [f'<@!{USER_ID}>', f'<@{USER_ID}>']
+
+    if guild_id is not None:
+        prefixes.extend(custom_prefix.get(guild_id, default_prefix))
+    else:
+        prefixes.extend([default_prefix])
+
+    return prefixes
+
+def run (guilds: int) -> None:
+    guild_ids = [random.getrandbits(62) for _ in range(guilds)]
+
+    # One in ten guilds has a custom prefix, stored with string keys as in prefix.json
+    custom_prefix = {str(guild_id): '?' for guild_id in guild_ids[::10]}
+    traffic = [random.choice(guild_ids) for _ in range(MESSAGES)]
+
+    start = time.perf_counter()
+    for guild_id in traffic:
+        legacy_resolve(custom_prefix, '!', guild_id)
+    legacy = time.perf_counter() - start
+
+    resolver = PrefixResolver('!', custom_prefix)
+    resolver.build(USER_ID)
+
+    start = time.perf_counter()
+    for guild_id in traffic:
+        resolver.resolve(guild_id)
+    resolved = time.perf_counter() - start
+
+    print(f'{guilds:>6} guilds | legacy {legacy / MESSAGES * 1e9:7.1f} ns/msg ({legacy * 1e3:6.1f} ms/min) '
+          f'| resolver {resolved / MESSAGES * 1e9:7.1f} ns/msg ({resolved * 1e3:6.1f} ms/min)')
+
+if __name__ == '__main__':
+    random.seed(0)
+    for count in (1_000, 5_000, 20_000):
+        run(count)
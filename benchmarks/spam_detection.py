@@ -0,0 +1,78 @@
+"""
+spam_detection.py
+
+Memory and cost of the flood detector over 2M messages from 1.8M members
+
+Messages arrive at 2000 per second from members that are mostly seen once,
+as in a large bot's message stream, with one member flooding. Keys idle for
+longer than the window are dropped as new keys come in, so the number of
+tracked members stays near the number active within the window however many
+members were seen
+
+Run from the repository root: python benchmarks/spam_detection.py
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'knightbot', 'src'))
+
+from ratewindow import (
+    SlidingWindow
+)
+
+MEMBERS  = 2_000_000
+RATE     = 2_000
+WINDOW   = (6, 5.0)
+FLOODER  = 2 ** 63
+
+def stream (window: SlidingWindow, messages: int, report: int = 0) -> (int, int):
+    """Feeds the messages to the window, returns the most members tracked and the floods detected"""
+
+    random.seed(0)
+
+    guild = 1 << 60
+    peak  = 0
+    hits  = 0
+
+    for index in range(messages):
+        # One in ten messages comes from a member that has just posted, one
+        # in a hundred from a member who floods at 20 messages per second
+        if index % 100 == 0:
+            member = FLOODER
+        elif random.random() < 0.1:
+            member = max(0, index - random.randrange(1, 20))
+        else:
+            member = index
+
+        # Simulated clock, every message is 1 / RATE seconds after the previous
+        key = guild << 64 | member
+        if window.hit(key, now = 1 + index / RATE):
+            hits += 1
+            window.reset(key)
+
+        peak = max(peak, len(window))
+        if report > 0 and (index + 1) % report == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f'  {index + 1:>9} messages: {len(window):>6} members tracked, {current / 2 ** 20:5.1f} MiB')
+
+    return peak, hits
+
+def main () -> None:
+    start      = time.perf_counter()
+    peak, hits = stream(SlidingWindow(*WINDOW, max_keys = 100_000), MEMBERS)
+    elapsed    = time.perf_counter() - start
+
+    print(f'{MEMBERS} messages from ~{MEMBERS * 0.9 / 1e6:.1f}M members at {RATE}/s, flood at {WINDOW[0]} messages in {WINDOW[1]:g} s')
+    print(f'  at most {peak} members tracked, {hits} floods detected, {elapsed / MEMBERS * 1e6:.2f} us/message')
+
+    # Memory of the first 200k messages, far past the first window
+    tracemalloc.start()
+    stream(SlidingWindow(*WINDOW, max_keys = 100_000), 200_000, 50_000)
+    tracemalloc.stop()
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
 import asyncio
+import datetime
 import json
 import os
+import re
+import sqlite3
+import time
 
 from discord import (
     Color,
@@ -11,9 +15,12 @@ from discord.ext.commands import (
     Context,
     command,
     group,
+    guild_only,
+    has_permissions,
     is_owner
 )
 from knightbot import (
+    CATEGORIES,
     INFO,
     UNUSED,
     Knight,
@@ -32,9 +39,40 @@ class cd:
     def __exit__ (self, exc_type, exc_val, exc_tb):
         os.chdir(self.saved_path)
 
+# Options of 'logs search', everything else is the query
+_SEARCH_OPTION = re.compile(r'\s*--(guild|since|page)\s+(\S+)')
+_DURATION      = re.compile(r'^(\d+)([smhd])$')
+_SECONDS       = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def _parse_log_search (arguments: str) -> (str, int, float, int):
+    """Splits the arguments of 'logs search' into the query, guild ID, start time and page"""
+
+    options = dict(_SEARCH_OPTION.findall(arguments))
+    query   = _SEARCH_OPTION.sub(' ', arguments).strip()
+
+    if len(query) == 0:
+        raise ValueError('Query not provided!')
+
+    guild_id = int(options['guild']) if 'guild' in options else None
+    page     = max(1, int(options.get('page', 1)))
+    since    = None
+
+    if 'since' in options:
+        duration = _DURATION.match(options['since'])
+        if duration is not None:
+            since = time.time() - int(duration.group(1)) * _SECONDS[duration.group(2)]
+        else:
+            since = datetime.datetime.strptime(options['since'], '%Y-%m-%d').replace(tzinfo = datetime.timezone.utc).timestamp()
+
+    return query, guild_id, since, page
+
 class Admin (Cog):
     """Admin Cog for Knight"""
 
+    # Custom prefixes a server can set and the length of each
+    _max_prefixes      = 5
+    _max_prefix_length = 16
+
     def __init__ (self, bot: Knight):
         self.bot = bot
         asyncio.gather(self.bot.common_logger.log(INFO, '```Admin Cog loaded!```'))
@@ -45,7 +83,7 @@ class Admin (Cog):
         """Displays cache"""
 
         embed = Embed(color       = Color.green(),
-                      description = f'```{json.dumps(self.bot.cache, indent = 4)}```',
+                      description = f'```{json.dumps({file: table.to_dict() for file, table in self.bot.cache.items()}, indent = 4)}```',
                       timestamp   = get_current_time(),
                       type        = 'rich')
         embed.set_author(name     = self.bot.user.name,
@@ -112,13 +150,296 @@ class Admin (Cog):
 
         await ctx.send(embed = embed)
 
+    @group(pass_context = True, brief = 'Cache snapshot commands')
+    @is_owner()
+    async def snapshot (self, ctx: Context):
+        """Commands for the versioned cache snapshots"""
+
+        if ctx.invoked_subcommand is None:
+            await ctx.send('Invalid subcommand!')
+
+    @snapshot.command(name = 'list', pass_context = True, brief = 'Lists cache snapshots')
+    async def snapshot_list (self, ctx: Context):
+        """Lists the cache snapshots, newest first"""
+
+        snapshots = '\n'.join(self.bot.snapshots.list())
+
+        embed = Embed(color       = Color.default(),
+                      description = f'```\n{snapshots or "No snapshots"}```',
+                      timestamp   = get_current_time(),
+                      title       = 'Snapshots',
+                      type        = 'rich')
+
+        await ctx.send(embed = embed)
+
+    @snapshot.command(name = 'create', pass_context = True, brief = 'Creates a cache snapshot')
+    async def snapshot_create (self, ctx: Context):
+        """Creates a cache snapshot now instead of waiting for the periodic backup"""
+
+        snapshot_id, changed = await self.bot.snapshot_cache()
+        await ctx.send(f'Created snapshot {snapshot_id}, {changed} file(s) changed')
+
+    @snapshot.command(name = 'restore', pass_context = True, brief = 'Restores a cache snapshot')
+    async def snapshot_restore (self, ctx: Context, snapshot_id: str):
+        """Replaces the cache with the contents of a snapshot"""
+
+        if snapshot_id not in self.bot.snapshots.list():
+            await ctx.send('Snapshot not found!')
+            return
+
+        restored, removed = await self.bot.restore_cache(snapshot_id)
+
+        await ctx.send(f'Restored {restored} file(s) from snapshot {snapshot_id}, removed {removed} file(s) created since')
+        await self.bot.common_logger.log(INFO, f'```Cache restored from snapshot {snapshot_id}```')
+
+    @group(pass_context = True, brief = 'Displays the command prefixes')
+    @guild_only()
+    async def prefix (self, ctx: Context):
+        """Displays the command prefixes of this server"""
+
+        if ctx.invoked_subcommand is None:
+            resolver = self.bot.prefix_resolver
+            prefixes = '\n'.join(resolver.custom_prefix.get(ctx.guild.id, resolver.default_prefix))
+
+            embed = Embed(color       = Color.default(),
+                          description = f'```\n{prefixes}```',
+                          timestamp   = get_current_time(),
+                          title       = 'Prefixes',
+                          type        = 'rich')
+
+            await ctx.send(embed = embed)
+
+    @prefix.command(name = 'set', pass_context = True, brief = 'Sets custom prefixes')
+    @has_permissions(manage_guild = True)
+    async def prefix_set (self, ctx: Context, *prefixes: str):
+        """Sets one or more custom prefixes for this server
+
+        Expected format: prefix set ?
+                         prefix set ? k!
+        """
+
+        if len(prefixes) == 0:
+            await ctx.send('Prefix not provided!')
+            return
+
+        # An empty prefix would make every message in the server a command
+        if any(len(prefix.strip()) == 0 for prefix in prefixes):
+            await ctx.send('Prefixes cannot be empty!')
+            return
+
+        if len(prefixes) > self._max_prefixes or any(len(prefix) > self._max_prefix_length for prefix in prefixes):
+            await ctx.send(f'At most {self._max_prefixes} prefixes of up to {self._max_prefix_length} characters can be set!')
+            return
+
+        self.bot.prefix_resolver.set_prefix(ctx.guild.id, prefixes)
+        self.bot.prefix_writer.schedule()
+
+        await ctx.send(f'Prefix set to {" ".join(prefixes)}')
+        await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, f'```\n{ctx.author.name}#{ctx.author.discriminator} set the prefix to {" ".join(prefixes)}```')
+
+    @prefix.command(name = 'reset', pass_context = True, brief = 'Resets to the default prefix')
+    @has_permissions(manage_guild = True)
+    async def prefix_reset (self, ctx: Context):
+        """Removes the custom prefixes of this server"""
+
+        if not self.bot.prefix_resolver.reset_prefix(ctx.guild.id):
+            await ctx.send('No custom prefix has been set!')
+            return
+
+        self.bot.prefix_writer.schedule()
+
+        await ctx.send('Prefix reset to default')
+        await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, f'```\n{ctx.author.name}#{ctx.author.discriminator} reset the prefix```')
+
+    @group(pass_context = True, brief = 'Displays the muted broadcasts')
+    @guild_only()
+    async def broadcasts (self, ctx: Context):
+        """Displays the log categories whose broadcasts are not sent to this server"""
+
+        if ctx.invoked_subcommand is None:
+            config = self.bot.guild_configs.get(ctx.guild.id)
+            muted  = '\n'.join(sorted(config.muted)) if config is not None else ''
+
+            embed = Embed(color       = Color.default(),
+                          description = f'```\n{muted or "No muted categories"}```',
+                          timestamp   = get_current_time(),
+                          title       = 'Muted broadcasts',
+                          type        = 'rich')
+
+            await ctx.send(embed = embed)
+
+    @staticmethod
+    async def _category (ctx: Context, category: str) -> str:
+        """Returns the name of a log category, None after replying if there is no such category"""
+
+        category = category.upper()
+        if category not in CATEGORIES:
+            await ctx.send(f'Unknown category, expected one of {", ".join(CATEGORIES)}')
+            return None
+        return category
+
+    async def _set_muted (self, ctx: Context, category: str, muted: bool) -> None:
+        category = await self._category(ctx, category)
+        if category is None:
+            return
+
+        config = self.bot.guild_configs.get(ctx.guild.id)
+        if config is None:
+            await ctx.send('This server has no log channel yet!')
+            return
+
+        self.bot.guild_configs[ctx.guild.id] = config.replace(muted = config.muted | {category} if muted else config.muted - {category})
+        self.bot.cache_writer.schedule()
+
+        action = 'muted' if muted else 'unmuted'
+        await ctx.send(f'{category} broadcasts {action}')
+        await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, f'```\n{ctx.author.name}#{ctx.author.discriminator} {action} {category} broadcasts```')
+
+    @broadcasts.command(name = 'mute', pass_context = True, brief = 'Stops broadcasts of a category')
+    @has_permissions(manage_guild = True)
+    async def broadcasts_mute (self, ctx: Context, category: str):
+        """Stops the broadcasts of a log category from being sent to this server
+
+        Expected format: broadcasts mute info
+        """
+        await self._set_muted(ctx, category, True)
+
+    @broadcasts.command(name = 'unmute', pass_context = True, brief = 'Resumes broadcasts of a category')
+    @has_permissions(manage_guild = True)
+    async def broadcasts_unmute (self, ctx: Context, category: str):
+        """Sends the broadcasts of a log category to this server again
+
+        Expected format: broadcasts unmute info
+        """
+        await self._set_muted(ctx, category, False)
+
+    @group(pass_context = True, brief = 'Displays the log level')
+    @guild_only()
+    async def loglevel (self, ctx: Context):
+        """Displays the categories logged to this server's log channel"""
+
+        if ctx.invoked_subcommand is None:
+            config = self.bot.guild_configs.get(ctx.guild.id)
+            level  = max(self.bot.channel_logger.level, 0 if config is None else config.level)
+            logged = ' '.join(name for name, category in CATEGORIES.items() if category.level >= level)
+
+            embed = Embed(color       = Color.default(),
+                          description = f'```\n{logged or "None"}```',
+                          timestamp   = get_current_time(),
+                          title       = 'Logged categories',
+                          type        = 'rich')
+
+            await ctx.send(embed = embed)
+
+    @loglevel.command(name = 'set', pass_context = True, brief = 'Sets the log level of this server')
+    @has_permissions(manage_guild = True)
+    async def loglevel_set (self, ctx: Context, category: str):
+        """Only sends messages of this category and above to this server's log channel
+
+        Expected format: loglevel set info
+        """
+
+        category = await self._category(ctx, category)
+        if category is None:
+            return
+
+        config = self.bot.guild_configs.get(ctx.guild.id)
+        if config is None:
+            await ctx.send('This server has no log channel yet!')
+            return
+
+        self.bot.guild_configs[ctx.guild.id] = config.replace(level = CATEGORIES[category].level)
+        self.bot.cache_writer.schedule()
+
+        await ctx.send(f'Log level set to {category}')
+        await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, '```\n{}#{} set the log level to {}```',
+                                                        ctx.author.name, ctx.author.discriminator, category)
+
+    @loglevel.command(name = 'global', pass_context = True, brief = 'Sets the global log level')
+    @is_owner()
+    async def loglevel_global (self, ctx: Context, category: str):
+        """Sets the minimum level of the file and every log channel until the bot restarts
+
+        Expected format: loglevel global info
+        """
+
+        category = await self._category(ctx, category)
+        if category is None:
+            return
+
+        self.bot.common_logger.set_level(CATEGORIES[category].level)
+        await ctx.send(f'Global log level set to {category}')
+
+    @group(pass_context = True, brief = 'Log commands')
+    @is_owner()
+    async def logs (self, ctx: Context):
+        """Commands for the log index"""
+
+        if ctx.invoked_subcommand is None:
+            await ctx.send('Invalid subcommand!')
+
+    @logs.command(name = 'search', pass_context = True, brief = 'Searches the log')
+    async def logs_search (self, ctx: Context, *, arguments: str):
+        """Searches the log index, newest records first
+
+        Expected format: logs search timeout
+                         logs search "cache update" --guild 1234 --since 2d --page 2
+
+        The query uses SQLite FTS5 syntax. --since takes a duration (30m, 12h,
+        7d) or a UTC date (2021-06-01)
+        """
+
+        index = self.bot.log_index
+        if index is None:
+            await ctx.send('The log index is disabled, set "log_index" in env.json')
+            return
+
+        try:
+            query, guild_id, since, page = _parse_log_search(arguments)
+        except ValueError as e:
+            await ctx.send(f'Invalid arguments: {e}')
+            return
+
+        page_size = 10
+        start     = time.perf_counter()
+
+        try:
+            records, more = await asyncio.get_event_loop().run_in_executor(None, index.search, query, guild_id, since,
+                                                                           (page - 1) * page_size, page_size)
+        except sqlite3.OperationalError as e:
+            await ctx.send(f'Invalid query: {e}')
+            return
+
+        elapsed = time.perf_counter() - start
+
+        lines = []
+        for timestamp, category, guild, message in records:
+            when    = datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            message = message.replace('`', '').strip()
+            lines.append(f'{when} {category} {guild or "-"}\n{message[:300]}')
+
+        results = '\n'.join(lines)
+
+        embed = Embed(color       = Color.default(),
+                      description = f'```\n{results or "No records found"}```',
+                      timestamp   = get_current_time(),
+                      title       = 'Log search',
+                      type        = 'rich')
+        embed.set_footer(text = f'Page {page} in {elapsed * 1e3:.1f} ms' + (f', next: --page {page + 1}' if more else ''))
+
+        await ctx.send(embed = embed)
+
     @command(brief = 'Logs out the bot')
     @is_owner()
     async def logout (self, ctx: Context):
         """Logs out the bot i.e. bot goes offline"""
         UNUSED(ctx)
         await self.bot.common_logger.log(INFO, '```Logged out!```')
-        self.bot.update_cache_file()
+        await self.bot.update_cache_file()
+        await self.bot.prefix_writer.flush()
+        await self.bot.channel_logger.flush()
+        await self.bot.file_logger.close()
+        self.bot.cases.close()
         await self.bot.close()
 
 def setup (bot: Knight):
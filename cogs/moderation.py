@@ -1,28 +1,126 @@
 import asyncio
+import datetime
+import os
+import re
+import shlex
+import time
 
 from discord import (
     Color,
     Embed,
-    Member
+    Guild,
+    HTTPException,
+    Member,
+    Message,
+    Object,
+    utils
 )
 from discord.ext.commands import (
     Cog,
     Context,
     command,
+    group,
     has_permissions
 )
 
 from knightbot import (
+    DEBUG,
+    ERROR,
     INFO,
+    AutomodConfig,
     Knight,
-    get_current_time
+    PurgeFilter,
+    PurgeJob,
+    RateLimiter,
+    SlidingWindow,
+    TermMatcher,
+    get_current_time,
+    get_flood_rate,
+    get_join_rate,
+    get_mention_rate,
+    get_spam_tracked_keys
 )
 
+# A user mention or a bare user ID
+_USER    = re.compile(r'<@!?(\d+)>|(\d{15,20})')
+_USER_ID = re.compile(r'\d{15,20}')
+
+def _parse_purge (arguments: str) -> (PurgeFilter, int, int, str):
+    """
+    Splits the arguments of the purge commands into a filter, the before and
+    after message IDs and the reason, which is everything that is not an option
+    """
+
+    authors     = []
+    bots        = False
+    pattern     = None
+    attachments = False
+    before      = None
+    after       = None
+    reason      = []
+
+    tokens = iter(shlex.split(arguments))
+
+    def value (option: str) -> str:
+        token = next(tokens, None)
+        if token is None:
+            raise ValueError(f'{option} needs a value')
+        return token
+
+    for token in tokens:
+        if token == '--user':
+            authors.append(int(re.sub(r'\D', '', value(token))))
+        elif token == '--bots':
+            bots = True
+        elif token == '--regex':
+            pattern = value(token)
+        elif token == '--attachments':
+            attachments = True
+        elif token == '--before':
+            before = int(value(token))
+        elif token == '--after':
+            after = int(value(token))
+        else:
+            reason.append(token)
+
+    return PurgeFilter(authors, bots, pattern, attachments), before, after, ' '.join(reason) or 'No reason provided'
+
 class Moderation (Cog):
     """Moderation Cog for Knight"""
 
+    # Seconds between updates of the progress message of a long running command
+    _progress_interval = 5
+
+    # massban and masskick run this many actions at once, paced to the ban and
+    # kick routes' rate limits
+    _mass_concurrency = 5
+    _mass_rate        = 10
+    _mass_per         = 10.0
+
+    # Terms an automod list of a guild can hold, words and phrases together
+    _automod_terms = 10000
+
     def __init__ (self, bot: Knight):
         self.bot = bot
+
+        # Running purges by channel ID
+        self._purges = {}
+
+        # Automod matchers by guild ID, with the term sets they were built
+        # from, and the builds running on executor threads
+        self._matchers = {}
+        self._building = {}
+
+        # Flood and mention counters by guild and member, join counters by
+        # guild with the IDs of the members who joined
+        self._floods   = SlidingWindow(*get_flood_rate(), max_keys = get_spam_tracked_keys())
+        self._mentions = SlidingWindow(*get_mention_rate(), max_keys = get_spam_tracked_keys())
+        self._joins    = SlidingWindow(*get_join_rate(), max_keys = get_spam_tracked_keys(), values = True)
+
+        # Guilds under a raid, mapped to when the raid is over if no one else
+        # joins and the limiter that paces the actions of the raid
+        self._raids = {}
+
         asyncio.gather(self.bot.common_logger.log(INFO, '```Moderation Cog loaded!```'))
 
     @command(brief = 'Kicks a user')
@@ -48,10 +146,15 @@ class Moderation (Cog):
                         value  = f'```\n{reason}```',
                         inline = False)
 
-        message = f'```\n{ctx.author.name}#{ctx.author.discriminator} kicked {user.name}#{user.discriminator}\n\nReason:\n\n{reason}```'
+        await self._kick_user(ctx.guild, user, reason)
+        number, = await self.bot.record_cases(ctx.guild, 'kick', [user.id], ctx.author.id, reason)
 
-        await user.kick(reason = reason)
-        await ctx.message.delete()
+        embed.set_footer(text = f'Case {number}')
+
+        message = (f'```\n{ctx.author.name}#{ctx.author.discriminator} kicked {user.name}#{user.discriminator}\n\nReason:\n\n{reason}'
+                   f'\n\nCase {number}```')
+
+        await self.bot.delete_message(ctx.message)
         await ctx.send(embed = embed)
         await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, message)
 
@@ -78,43 +181,729 @@ class Moderation (Cog):
                         value  = f'```\n{reason}```',
                         inline = False)
 
-        message = f'```\n{ctx.author.name}#{ctx.author.discriminator} banned {user.name}#{user.discriminator}\n\nReason:\n\n{reason}```'
+        await self._ban_user(ctx.guild, user, reason)
+        number, = await self.bot.record_cases(ctx.guild, 'ban', [user.id], ctx.author.id, reason)
+
+        embed.set_footer(text = f'Case {number}')
 
-        await user.ban(reason = reason)
-        await ctx.message.delete()
+        message = (f'```\n{ctx.author.name}#{ctx.author.discriminator} banned {user.name}#{user.discriminator}\n\nReason:\n\n{reason}'
+                   f'\n\nCase {number}```')
+
+        await self.bot.delete_message(ctx.message)
         await ctx.send(embed = embed)
         await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, message)
 
-    @command(brief = 'Bulk deletes messages')
+    @staticmethod
+    async def _kick_user (guild: Guild, user: Object, reason: str) -> None:
+        await guild.kick(user, reason = reason)
+
+    @staticmethod
+    async def _ban_user (guild: Guild, user: Object, reason: str) -> None:
+        # Works for users that are not members, e.g. IDs collected during a raid
+        await guild.ban(user, reason = reason, delete_message_days = 0)
+
+    async def _wait_with_progress (self, ctx: Context, task: asyncio.Future, describe) -> Message:
+        """
+        Waits for a task, sending a progress message built by describe() and
+        editing it every _progress_interval seconds while the task runs.
+        Returns the progress message, None if the task finished before one was sent
+        """
+
+        progress = None
+
+        while not task.done():
+            await asyncio.wait({task}, timeout = self._progress_interval)
+
+            if not task.done():
+                content = describe()
+                if progress is None:
+                    progress = await ctx.send(content)
+                else:
+                    await progress.edit(content = content)
+
+        task.result()
+        return progress
+
+    @staticmethod
+    async def _report (ctx: Context, progress: Message, message: str) -> None:
+        """Replaces the progress message with the result, or sends the result if there was none"""
+
+        if progress is None:
+            await ctx.send(message)
+        else:
+            await progress.edit(content = message)
+
+    async def _run_purge (self, ctx: Context, limit: int, arguments: str, on_message = None) -> (PurgeJob, str, Message):
+        """
+        Runs a purge of the messages before the invoking command, updating a
+        progress message while it takes longer than _progress_interval
+        """
+
+        if ctx.channel.id in self._purges:
+            await ctx.send('A purge is already running in this channel, use purge cancel to stop it')
+            return None, None, None
+
+        try:
+            purge_filter, before, after, reason = _parse_purge(arguments)
+        except (ValueError, re.error) as e:
+            await ctx.send(f'Invalid arguments! {e}')
+            return None, None, None
+
+        await self.bot.delete_message(ctx.message)
+
+        job = PurgeJob(ctx.channel, limit, purge_filter,
+                       before      = ctx.message.id if before is None else before,
+                       after       = after,
+                       on_message  = on_message,
+                       deleted_ids = self.bot.deleted_messages)
+
+        self._purges[ctx.channel.id] = job
+
+        try:
+            progress = await self._wait_with_progress(ctx, asyncio.ensure_future(job.run()),
+                                                      lambda: f'Purging... {job.deleted} deleted, {job.scanned}/{limit} messages checked')
+        finally:
+            self._purges.pop(ctx.channel.id, None)
+
+        return job, reason, progress
+
+    @staticmethod
+    def _purge_summary (ctx: Context, job: PurgeJob, reason: str) -> str:
+        status = ' (cancelled)' if job.cancelled else ''
+        failed = f', {job.failed} could not be deleted' if job.failed > 0 else ''
+
+        return (f'```\n{ctx.author.name}#{ctx.author.discriminator} purged {job.deleted} messages in #{ctx.channel.name}{status}'
+                f'{failed}\n\nReason:\n\n{reason}```')
+
+    @group(invoke_without_command = True, brief = 'Bulk deletes messages')
     @has_permissions(manage_messages = True)
-    async def purge (self, ctx: Context, limit: int, *, reason = 'No reason provided'):
-        """Bulk deletes messages without a cached copy to review in future"""
+    async def purge (self, ctx: Context, limit: int, *, arguments: str = ''):
+        """Bulk deletes messages without a cached copy to review in future
+
+        Checks the last `limit` messages before the command and deletes those
+        matching every option given, anything else is the reason
+
+        Expected format: purge 50
+                         purge 200 --user @someone --attachments spam
+                         purge 500 --bots --regex "https?://" --before 1234 --after 1200
+
+        Messages older than 14 days are deleted one at a time, which is slow
+        """
 
-        message = f'```\n{ctx.author.name}#{ctx.author.discriminator} purged {limit} messages\n\nReason:\n\n{reason}```'
+        job, reason, progress = await self._run_purge(ctx, limit, arguments)
+        if job is None:
+            return
 
-        # limit + 1 to delete invoking command message too
-        await ctx.channel.purge(limit = limit + 1)
+        message = self._purge_summary(ctx, job, reason)
+
+        await self._report(ctx, progress, message)
         await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, message)
-        await ctx.send(message)
+
+    @purge.command(name = 'cancel', brief = 'Stops a running purge')
+    @has_permissions(manage_messages = True)
+    async def purge_cancel (self, ctx: Context):
+        """Stops the purge running in this channel"""
+
+        job = self._purges.get(ctx.channel.id)
+        if job is None:
+            await ctx.send('No purge is running in this channel!')
+            return
+
+        job.cancel()
 
     @command(brief = 'Bulk deletes messages')
     @has_permissions(manage_messages = True)
-    async def cachedpurge (self, ctx: Context, limit: int, *, reason = 'No reason provided'):
-        """Bulk deletes messages with a cached copy to review in future"""
+    async def cachedpurge (self, ctx: Context, limit: int, *, arguments: str = ''):
+        """Bulk deletes messages with a transcript sent to the log channel to review in future
+
+        Takes the same options as purge
+        """
+
+        transcript = self.bot.open_transcript(f'purge-{ctx.channel.id}-{ctx.message.id}')
+        sent       = False
+
+        try:
+            # The transcript is written while the history is read, so only the
+            # current chunk of messages is held in memory
+            with transcript:
+                job, reason, progress = await self._run_purge(ctx, limit, arguments, transcript.write)
+
+            if job is None:
+                return
+
+            message = self._purge_summary(ctx, job, reason)
+
+            await self._report(ctx, progress, message)
+
+            # send_transcript removes or keeps the file from here on
+            sent = True
+            await self.bot.send_transcript(ctx.guild, message, transcript)
+        finally:
+            if not sent and os.path.exists(transcript.path):
+                os.remove(transcript.path)
+
+    @staticmethod
+    async def _mass_targets (ctx: Context, arguments: str) -> ([int], str):
+        """
+        Collects the user IDs of a mass action from mentions and IDs in the
+        arguments and from files attached to the command. Everything else is the reason
+        """
+
+        user_ids = []
+        reason   = []
+
+        for token in shlex.split(arguments):
+            match = _USER.fullmatch(token)
+            if match is not None:
+                user_ids.append(int(match.group(1) or match.group(2)))
+            else:
+                reason.append(token)
+
+        for attachment in ctx.message.attachments:
+            content = (await attachment.read()).decode('utf-8', 'replace')
+            user_ids.extend(int(user_id) for user_id in _USER_ID.findall(content))
+
+        # Duplicates removed, in the order given
+        return list(dict.fromkeys(user_ids)), ' '.join(reason) or 'No reason provided'
+
+    async def _mass_action (self, ctx: Context, arguments: str, action, name: str, verb: str) -> None:
+        try:
+            user_ids, reason = await self._mass_targets(ctx, arguments)
+        except ValueError as e:
+            await ctx.send(f'Invalid arguments! {e}')
+            return
+
+        protected = {ctx.author.id, self.bot.user.id, ctx.guild.owner_id}
+        user_ids  = [user_id for user_id in user_ids if user_id not in protected]
+
+        if len(user_ids) == 0:
+            await ctx.send('No users provided!')
+            return
+
+        semaphore = asyncio.Semaphore(self._mass_concurrency)
+        limiter   = RateLimiter(self._mass_rate, self._mass_per)
+        done      = []
+        failed    = []
+
+        async def act (user_id: int) -> None:
+            async with semaphore, limiter:
+                # Caught for every user, so that one error does not stop the
+                # others or the cases and the summary of those already done
+                try:
+                    await action(ctx.guild, Object(user_id), reason)
+                    done.append(user_id)
+                except HTTPException:
+                    failed.append(user_id)
+                except Exception as exception:
+                    failed.append(user_id)
+                    await self.bot.file_logger.log(ERROR, f'{verb.capitalize()} {user_id} in guild {ctx.guild.id} failed: {exception!r}')
+
+        progress = await self._wait_with_progress(ctx, asyncio.ensure_future(asyncio.gather(*[act(user_id) for user_id in user_ids])),
+                                                  lambda: f'{len(done) + len(failed)}/{len(user_ids)} users done, {len(failed)} failed')
+
+        # One transaction for every case of the action
+        numbers = await self.bot.record_cases(ctx.guild, name, done, ctx.author.id, reason)
+        cases   = f'\n\nCases {numbers[0]} to {numbers[-1]}' if len(numbers) > 0 else ''
+
+        message = f'```\n{ctx.author.name}#{ctx.author.discriminator} {verb} {len(done)} of {len(user_ids)} users\n\nReason:\n\n{reason}{cases}```'
+
+        await self._report(ctx, progress, message)
+
+        def summary () -> str:
+            listed = ', '.join(str(user_id) for user_id in failed[:50])
+            more   = f' and {len(failed) - 50} more' if len(failed) > 50 else ''
+            return f'{message}\n{len(failed)} failed{": " + listed + more if len(failed) > 0 else ""}'
+
+        # One entry for the whole action instead of one per user
+        await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, summary)
+
+    @command(brief = 'Bans many users')
+    @has_permissions(ban_members = True)
+    async def massban (self, ctx: Context, *, arguments: str = ''):
+        """Bans every user mentioned or given by ID, including IDs in attached files
+
+        Users do not need to be members, anything that is not a user is the reason
+
+        Expected format: massban @raider1 @raider2 123456789012345678 raid
+                         massban raid (with a file of IDs attached)
+        """
+        await self._mass_action(ctx, arguments, self._ban_user, 'ban', 'banned')
+
+    @command(brief = 'Kicks many users')
+    @has_permissions(kick_members = True)
+    async def masskick (self, ctx: Context, *, arguments: str = ''):
+        """Kicks every member mentioned or given by ID, including IDs in attached files
+
+        Anything that is not a user is the reason
+
+        Expected format: masskick @raider1 @raider2 123456789012345678 raid
+                         masskick raid (with a file of IDs attached)
+        """
+        await self._mass_action(ctx, arguments, self._kick_user, 'kick', 'kicked')
+
+    @staticmethod
+    def _case_line (case: tuple) -> str:
+        number, action, target, moderator, reason, timestamp = case
+        when = datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+        return f'#{number} {action} {when} by <@{moderator}>: {reason[:100]}'
+
+    @command(brief = 'Shows a moderation case')
+    @has_permissions(kick_members = True)
+    async def case (self, ctx: Context, number: int):
+        """Shows a kick or ban recorded by Knight
+
+        Expected format: case 42
+        """
+
+        case = await asyncio.get_event_loop().run_in_executor(None, self.bot.cases.get, ctx.guild.id, number)
+        if case is None:
+            await ctx.send(f'Case {number} does not exist!')
+            return
+
+        number, action, target, moderator, reason, timestamp = case
+
+        embed = Embed(color     = Color.red(),
+                      title     = f'Case {number}: {action}',
+                      timestamp = datetime.datetime.utcfromtimestamp(timestamp),
+                      type      = 'rich')
+
+        embed.add_field(name   = 'User',
+                        value  = f'<@{target}> ({target})',
+                        inline = False)
+
+        embed.add_field(name   = 'Moderator',
+                        value  = f'<@{moderator}> ({moderator})',
+                        inline = False)
+
+        embed.add_field(name   = 'Reason',
+                        value  = f'```\n{reason[:1000]}```',
+                        inline = False)
+
+        await ctx.send(embed = embed)
+
+    @command(brief = 'Lists the cases of a user')
+    @has_permissions(kick_members = True)
+    async def history (self, ctx: Context, user: str, page: int = 1):
+        """Lists the kicks and bans of a user, newest first, 10 per page
+
+        Users do not need to be members
+
+        Expected format: history @someone
+                         history 123456789012345678 2
+        """
+
+        match = _USER.fullmatch(user)
+        if match is None:
+            await ctx.send('Invalid user, expected a mention or an ID')
+            return
+
+        user_id   = int(match.group(1) or match.group(2))
+        page      = max(1, page)
+        page_size = 10
+        start     = time.perf_counter()
+
+        cases, total = await asyncio.get_event_loop().run_in_executor(None, self.bot.cases.history, ctx.guild.id, user_id,
+                                                                      (page - 1) * page_size, page_size)
+
+        elapsed = time.perf_counter() - start
+        pages   = max(1, -(-total // page_size))
+
+        embed = Embed(color       = Color.default(),
+                      description = '\n'.join(self._case_line(case) for case in cases) or 'No cases found',
+                      timestamp   = get_current_time(),
+                      title       = f'History of {user_id}: {total} cases',
+                      type        = 'rich')
+        embed.set_footer(text = f'Page {page} of {pages} in {elapsed * 1e3:.1f} ms')
+
+        await ctx.send(embed = embed)
+
+    @command(brief = 'Shows moderation statistics')
+    @has_permissions(kick_members = True)
+    async def modstats (self, ctx: Context):
+        """Shows the number of kicks and bans in this server, in total and by moderator"""
+
+        start  = time.perf_counter()
+        counts = await asyncio.get_event_loop().run_in_executor(None, self.bot.cases.stats, ctx.guild.id)
+
+        elapsed = time.perf_counter() - start
+
+        totals = {}
+        for actions in counts.values():
+            for action, count in actions.items():
+                totals[action] = totals.get(action, 0) + count
+
+        # The 10 moderators with the most cases
+        moderators = sorted(counts.items(), key = lambda item: sum(item[1].values()), reverse = True)[:10]
+
+        embed = Embed(color     = Color.default(),
+                      timestamp = get_current_time(),
+                      title     = 'Moderation statistics',
+                      type      = 'rich')
+
+        embed.add_field(name   = 'Total',
+                        value  = '\n'.join(f'{action}: {count}' for action, count in sorted(totals.items())) or 'No cases',
+                        inline = False)
+
+        if len(moderators) > 0:
+            embed.add_field(name   = 'Moderators',
+                            value  = '\n'.join(f'<@{moderator}>: ' + ', '.join(f'{count} {action}' for action, count in sorted(actions.items()))
+                                               for moderator, actions in moderators),
+                            inline = False)
+
+        embed.set_footer(text = f'{elapsed * 1e3:.1f} ms')
+
+        await ctx.send(embed = embed)
+
+    async def _build_matcher (self, config: AutomodConfig) -> None:
+        entry   = self._matchers.get(config.guild_id)
+        words   = config.words
+        phrases = config.phrases
+
+        try:
+            # An edit only inserts or removes the terms that changed in a copy of the current matcher
+            build   = TermMatcher if entry is None else entry[0].edited
+            matcher = await asyncio.get_event_loop().run_in_executor(None, build, words, phrases)
+            self._matchers[config.guild_id] = (matcher, words, phrases)
+        finally:
+            self._building.pop(config.guild_id, None)
+
+    async def _matcher (self, config: AutomodConfig, wait: bool = False) -> TermMatcher:
+        """
+        Returns the matcher of a guild. When the term lists have changed, a
+        new matcher is built on an executor thread while messages are still
+        matched with the previous one. Only the first matcher of a guild is
+        waited for, unless `wait` is set
+        """
+
+        while True:
+            entry = self._matchers.get(config.guild_id)
+            if entry is not None and entry[1] is config.words and entry[2] is config.phrases:
+                return entry[0]
+
+            build = self._building.get(config.guild_id)
+            if build is None:
+                build = self._building[config.guild_id] = asyncio.ensure_future(self._build_matcher(config))
+
+            if entry is not None and not wait:
+                return entry[0]
+
+            # Shielded, a cancelled message handler does not cancel the build others wait for
+            await asyncio.shield(build)
+
+            # The build may have been of older lists, checked against the lists now in effect
+            config = self.bot.automod_configs.get(config.guild_id) or config
+
+    @Cog.listener()
+    async def on_message (self, message: Message):
+        if message.guild is None or message.author.bot:
+            return
+
+        config = self.bot.automod_configs.get(message.guild.id)
+        if config is None:
+            return
+
+        # Webhooks are not members, moderators are not checked
+        if not isinstance(message.author, Member) or message.author.guild_permissions.manage_messages:
+            return
+
+        if len(config.spam_actions) > 0:
+            spam = self._detect_spam(message)
+            if spam is not None:
+                await self._spam_action(message, config, spam)
+                return
+
+        if len(config.words) + len(config.phrases) > 0:
+            term = (await self._matcher(config)).find(message.content)
+            if term is not None:
+                await self._automod_action(message, config, term)
+
+    def _detect_spam (self, message: Message) -> str:
+        """Counts a message towards the flood and mention detectors, returns what it triggered, None if nothing"""
+
+        # One int per member instead of a tuple
+        key      = message.guild.id << 64 | message.author.id
+        mentions = len(message.raw_mentions) + len(message.raw_role_mentions) + (1 if message.mention_everyone else 0)
+        spam     = None
+
+        if self._floods.hit(key):
+            spam = 'flood'
+        if mentions > 0 and self._mentions.hit(key, mentions):
+            spam = 'mention spam'
+
+        # The member starts over once acted on
+        if spam is not None:
+            self._floods.reset(key)
+            self._mentions.reset(key)
+
+        return spam
+
+    async def _automod_action (self, message: Message, config: AutomodConfig, term: str) -> None:
+        guild  = message.guild
+        author = message.author
+        reason = f'Automod: matched "{term}"'
+        done   = []
+
+        for action in config.actions:
+            try:
+                if action == 'delete':
+                    await self.bot.delete_message(message)
+                elif action == 'warn':
+                    await message.channel.send(f'{author.mention} your message contains a blocked term!', delete_after = 10)
+                elif action == 'kick':
+                    await self._kick_user(guild, author, reason)
+                    await self.bot.record_cases(guild, 'kick', [author.id], self.bot.user.id, reason)
+                elif action == 'ban':
+                    await self._ban_user(guild, author, reason)
+                    await self.bot.record_cases(guild, 'ban', [author.id], self.bot.user.id, reason)
+                done.append(action)
+            except HTTPException:
+                pass
+
+        await self.bot.common_logger.guild_specific_log(guild, INFO, '```\nAutomod matched "{}" in a message of {}#{} ({}) in #{}\n\nActions: {}\n\nContent:\n\n{}```',
+                                                        term, author.name, author.discriminator, author.id, message.channel.name,
+                                                        ', '.join(done) or 'None', message.content.replace('`', '')[:500])
+
+    async def _spam_action (self, message: Message, config: AutomodConfig, spam: str) -> None:
+        guild   = message.guild
+        author  = message.author
+        reason  = f'Automod: {spam}'
+        done    = []
+        deleted = 0
+
+        for action in config.spam_actions:
+            try:
+                if action == 'purge':
+                    # Left to the purge already running in the channel, and
+                    # then not reported as done
+                    if message.channel.id in self._purges:
+                        continue
+
+                    # The member's messages in this channel since the window of the detectors began
+                    window = max(self._floods.per, self._mentions.per)
+                    after  = utils.time_snowflake(message.created_at - datetime.timedelta(seconds = window))
+
+                    job = PurgeJob(message.channel, 100, PurgeFilter([author.id]),
+                                   after       = after,
+                                   deleted_ids = self.bot.deleted_messages)
+
+                    self._purges[message.channel.id] = job
+                    try:
+                        deleted = (await job.run()).deleted
+                    finally:
+                        self._purges.pop(message.channel.id, None)
+                elif action == 'warn':
+                    await message.channel.send(f'{author.mention} slow down!', delete_after = 10)
+                elif action == 'kick':
+                    await self._kick_user(guild, author, reason)
+                    await self.bot.record_cases(guild, 'kick', [author.id], self.bot.user.id, reason)
+                elif action == 'ban':
+                    await self._ban_user(guild, author, reason)
+                    await self.bot.record_cases(guild, 'ban', [author.id], self.bot.user.id, reason)
+                done.append(action)
+            except HTTPException:
+                pass
+
+        await self.bot.common_logger.guild_specific_log(guild, INFO, '```\nAutomod detected {} by {}#{} ({}) in #{}\n\nActions: {}{}```',
+                                                        spam, author.name, author.discriminator, author.id, message.channel.name,
+                                                        ', '.join(done) or 'None', f'\n\n{deleted} messages purged' if deleted > 0 else '')
+
+    @Cog.listener()
+    async def on_member_join (self, member: Member):
+        guild  = member.guild
+        config = self.bot.automod_configs.get(guild.id)
+
+        if config is None or len(config.raid_actions) == 0 or member.bot:
+            return
+
+        now   = time.monotonic()
+        raid  = self._raids.get(guild.id)
+        burst = self._joins.hit(guild.id, now = now, value = member.id)
+
+        if raid is not None and now < raid[0]:
+            # Members joining during a raid are acted on as they come
+            self._raids[guild.id] = (now + self._joins.per, raid[1])
+            await self._raid_action(guild, config, [member.id], raid[1], False)
+        elif burst:
+            limiter = RateLimiter(self._mass_rate, self._mass_per)
+            self._raids[guild.id] = (now + self._joins.per, limiter)
+            await self._raid_action(guild, config, self._joins.recent(guild.id, now), limiter, True)
+        elif raid is not None:
+            del self._raids[guild.id]
+
+    async def _raid_action (self, guild: Guild, config: AutomodConfig, user_ids: [int], limiter: RateLimiter, started: bool) -> None:
+        """Acts on members who joined during a raid, paced like massban and masskick"""
+
+        reason  = 'Automod: raid'
+        actions = {'kick': self._kick_user, 'ban': self._ban_user}
+        done    = {}
+
+        for name in config.raid_actions:
+            done[name] = []
+
+            for user_id in user_ids:
+                async with limiter:
+                    try:
+                        await actions[name](guild, Object(user_id), reason)
+                        done[name].append(user_id)
+                    except HTTPException:
+                        pass
+
+            # One transaction for every case of the action
+            await self.bot.record_cases(guild, name, done[name], self.bot.user.id, reason)
+
+        summary = ', '.join(f'{name} {len(users)}/{len(user_ids)}' for name, users in done.items())
+
+        if started:
+            await self.bot.common_logger.guild_specific_log(guild, INFO, '```\nAutomod detected a raid, {} members joined within {:g} seconds\n\n'
+                                                                         'Actions: {}\n\nMembers joining until it is over are acted on too```',
+                                                            len(user_ids), self._joins.per, summary)
+        else:
+            await self.bot.common_logger.guild_specific_log(guild, DEBUG, '```\nAutomod raid: {}\n\nActions: {}```',
+                                                            ', '.join(str(user_id) for user_id in user_ids), summary)
+
+    @group(invoke_without_command = True, brief = 'Shows the automod settings')
+    @has_permissions(manage_guild = True)
+    async def automod (self, ctx: Context):
+        """Shows the automod settings of this server
+
+        Messages containing a word or phrase of the lists are acted on, words
+        only match whole words. Floods, mention spam and raids are acted on
+        once their actions are set. Members who can manage messages are not checked
+        """
+
+        config = self.bot.automod_configs.get(ctx.guild.id) or AutomodConfig(ctx.guild.id)
+
+        settings = (f'Words: {len(config.words)}\nPhrases: {len(config.phrases)}\nActions: {" ".join(config.actions) or "None"}\n'
+                    f'Spam actions: {" ".join(config.spam_actions) or "None"}\nRaid actions: {" ".join(config.raid_actions) or "None"}')
+
+        embed = Embed(color       = Color.default(),
+                      description = f'```\n{settings}```',
+                      timestamp   = get_current_time(),
+                      title       = 'Automod',
+                      type        = 'rich')
+
+        await ctx.send(embed = embed)
+
+    async def _edit_terms (self, ctx: Context, kind: str, terms: str, add: bool) -> None:
+        kind = kind.lower()
+        if kind not in ('word', 'phrase'):
+            await ctx.send('Invalid list, expected word or phrase')
+            return
+
+        # Words are split on whitespace, a phrase is the whole text. Attached files hold one term per line
+        edited = terms.split() if kind == 'word' else [terms.strip()]
+        for attachment in ctx.message.attachments:
+            edited.extend((await attachment.read()).decode('utf-8', 'replace').splitlines())
+
+        edited = {term.strip().casefold() for term in edited} - {''}
+        if len(edited) == 0:
+            await ctx.send('No terms provided!')
+            return
+
+        config = self.bot.automod_configs.get(ctx.guild.id) or AutomodConfig(ctx.guild.id)
+        terms  = config.words if kind == 'word' else config.phrases
+
+        # A new set, so that the matcher sees the change
+        terms = terms | edited if add else terms - edited
+
+        if add and len(terms) + len(config.phrases if kind == 'word' else config.words) > self._automod_terms:
+            await ctx.send(f'The automod lists can hold at most {self._automod_terms} terms!')
+            return
+
+        if kind == 'word':
+            config = config.replace(words = frozenset(terms))
+        else:
+            config = config.replace(phrases = frozenset(terms))
+
+        self.bot.automod_configs[ctx.guild.id] = config
+        self.bot.cache_writer.schedule()
+
+        # The lists are in effect once the command has replied
+        await self._matcher(config, wait = True)
+
+        await ctx.send(f'Automod {kind} list updated, {len(terms)} {kind}s')
+        await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, '```\n{}#{} {} {} automod {}(s)```',
+                                                        ctx.author.name, ctx.author.discriminator,
+                                                        'added' if add else 'removed', len(edited), kind)
+
+    @automod.command(name = 'add', brief = 'Adds automod terms')
+    @has_permissions(manage_guild = True)
+    async def automod_add (self, ctx: Context, kind: str, *, terms: str = ''):
+        """Adds words or a phrase to the automod lists, or one term per line of attached files
+
+        Expected format: automod add word badword otherword
+                         automod add phrase some bad phrase
+        """
+        await self._edit_terms(ctx, kind, terms, True)
+
+    @automod.command(name = 'remove', brief = 'Removes automod terms')
+    @has_permissions(manage_guild = True)
+    async def automod_remove (self, ctx: Context, kind: str, *, terms: str = ''):
+        """Removes words or a phrase from the automod lists
+
+        Expected format: automod remove word badword otherword
+                         automod remove phrase some bad phrase
+        """
+        await self._edit_terms(ctx, kind, terms, False)
+
+    @automod.command(name = 'actions', brief = 'Sets the automod actions')
+    @has_permissions(manage_guild = True)
+    async def automod_actions (self, ctx: Context, *actions: str):
+        """Sets what is done with a message that contains a term, in order
+
+        Actions: delete, warn, kick and ban. Every match is logged
+
+        Expected format: automod actions delete warn
+                         automod actions delete ban
+        """
+
+        await self._set_actions(ctx, 'actions', AutomodConfig.ACTIONS, actions)
+
+    @automod.command(name = 'spam', brief = 'Sets the flood and mention spam actions')
+    @has_permissions(manage_guild = True)
+    async def automod_spam (self, ctx: Context, *actions: str):
+        """Sets what is done with a member who floods a channel or spams mentions, in order
+
+        Actions: purge, warn, kick and ban. purge deletes the member's recent
+        messages in the channel. No actions turn the detector off
+
+        Expected format: automod spam purge warn
+                         automod spam
+        """
+        await self._set_actions(ctx, 'spam_actions', AutomodConfig.SPAM_ACTIONS, actions)
+
+    @automod.command(name = 'raid', brief = 'Sets the raid actions')
+    @has_permissions(manage_guild = True)
+    async def automod_raid (self, ctx: Context, *actions: str):
+        """Sets what is done with the members who join during a raid
+
+        Actions: kick and ban. No actions turn the detector off
+
+        Expected format: automod raid kick
+                         automod raid
+        """
+        await self._set_actions(ctx, 'raid_actions', AutomodConfig.RAID_ACTIONS, actions)
+
+    async def _set_actions (self, ctx: Context, attribute: str, allowed: (str,), actions: (str,)) -> None:
+        actions = tuple(dict.fromkeys(action.lower() for action in actions))
+        unknown = [action for action in actions if action not in allowed]
 
-        message = f'```\n{ctx.author.name}#{ctx.author.discriminator} purged {limit} messages\n\nReason:\n\n{reason}```'
+        if len(unknown) > 0:
+            await ctx.send(f'Unknown actions {", ".join(unknown)}, expected {", ".join(allowed)}')
+            return
 
-        # limit + 1 to delete invoking command message too
-        purged_messages = await ctx.channel.purge(limit = limit + 1)
-        await self.bot.common_logger.log(INFO, message)
-        await ctx.send(message)
+        config = (self.bot.automod_configs.get(ctx.guild.id) or AutomodConfig(ctx.guild.id)).replace(**{attribute: actions})
 
-        content = f'{message}\n\n'
+        self.bot.automod_configs[ctx.guild.id] = config
+        self.bot.cache_writer.schedule()
 
-        for index, message in enumerate(purged_messages, start = 1):
-            content += f'```\n{index}\n```{message.content}\n\n'
+        await ctx.send(f'Automod {attribute.replace("_", " ")} set to {" ".join(actions) or "None"}')
 
-        await self.bot.common_logger.guild_specific_log(ctx.guild, INFO, content)
+    @Cog.listener()
+    async def on_guild_remove (self, guild: Guild):
+        self._matchers.pop(guild.id, None)
+        self._raids.pop(guild.id, None)
+        self._joins.reset(guild.id)
 
 def setup (bot: Knight):
     bot.add_cog(Moderation(bot))
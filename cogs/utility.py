@@ -88,8 +88,8 @@ Latency: {latency}
                          icon_url = self.bot.user.avatar_url)
 
         await ctx.send(embed = embed)
-        await self.bot.common_logger.guild_specific_log(ctx.guild, DEBUG, f'Message by {ctx.author.name}#{ctx.author.discriminator}:\n\n{message}')
-        await ctx.message.delete()
+        await self.bot.common_logger.guild_specific_log(ctx.guild, DEBUG, 'Message by {}#{}:\n\n{}', ctx.author.name, ctx.author.discriminator, message)
+        await self.bot.delete_message(ctx.message)
 
     @command(brief = 'Uptime')
     async def uptime (self, ctx: Context):
@@ -178,5 +178,11 @@ Started at: {starttime}
                     await self.user(ctx, user = member)
                     return
 
+            # Members are not cached in the low memory profile, ask Discord instead
+            if not ctx.guild.chunked:
+                members = await ctx.guild.query_members(query = name, limit = 1)
+                if len(members) > 0:
+                    await self.user(ctx, user = members[0])
+
 def setup (bot: Knight) -> None:
     bot.add_cog(Utility(bot))
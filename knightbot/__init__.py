@@ -1,7 +1,21 @@
 from knightbot.src import (
+    automod,
+    cases,
+    channelindex,
     constants,
+    guildconfig,
     knight,
-    logger
+    logger,
+    logindex,
+    messagestore,
+    prefix,
+    profiles,
+    purge,
+    ratelimit,
+    ratewindow,
+    snapshot,
+    storage,
+    transcript
 )
 
 from knightbot.src.constants import (
@@ -11,13 +25,55 @@ from knightbot.src.constants import (
     get_owner,
     get_token,
     get_support,
+    get_snapshot_retention,
+    get_sweep_concurrency,
+    get_sweep_rate,
+    get_memory_profile,
+    get_log_flush_interval,
+    get_log_queue_size,
+    get_log_overflow,
+    get_log_format,
+    get_log_max_bytes,
+    get_log_rotate_daily,
+    get_log_level,
+    get_log_index,
+    get_log_index_retention,
+    get_message_store_bytes,
+    get_message_store_per_channel,
+    get_message_store_compress_above,
+    get_transcript_format,
+    get_transcript_keep,
+    get_flood_rate,
+    get_mention_rate,
+    get_join_rate,
+    get_spam_tracked_keys,
     get_env_directory,
     get_custom_prefix,
     get_log_directory,
+    get_cache_backend,
     get_cache_directory,
     get_default_prefix,
 )
 
+from knightbot.src.automod import (
+    AutomodConfig,
+    AutomodConfigCodec,
+    TermMatcher
+)
+
+from knightbot.src.cases import (
+    CaseStore
+)
+
+from knightbot.src.channelindex import (
+    GuildChannelIndex
+)
+
+from knightbot.src.guildconfig import (
+    GuildConfig,
+    GuildConfigCodec
+)
+
 from knightbot.src.knight import (
     UNUSED,
     Knight
@@ -27,11 +83,59 @@ from knightbot.src.logger import (
     DEBUG,
     ERROR,
     INFO,
+    CATEGORIES,
     FileLogger,
     ChannelLogger,
     CommonLogger,
 )
 
+from knightbot.src.logindex import (
+    LogIndex
+)
+
+from knightbot.src.messagestore import (
+    MessageStore,
+    StoredMessage
+)
+
+from knightbot.src.prefix import (
+    PrefixResolver
+)
+
+from knightbot.src.profiles import (
+    MEMORY_PROFILES,
+    client_options
+)
+
+from knightbot.src.purge import (
+    PurgeFilter,
+    PurgeJob,
+    RecentIds
+)
+
+from knightbot.src.ratelimit import (
+    RateLimiter
+)
+
+from knightbot.src.ratewindow import (
+    SlidingWindow
+)
+
+from knightbot.src.snapshot import (
+    SnapshotStore
+)
+
+from knightbot.src.storage import (
+    CacheTable,
+    Codec,
+    JSONStorage,
+    SQLiteStorage
+)
+
+from knightbot.src.transcript import (
+    TranscriptWriter
+)
+
 __author__  = 'Aryan V S'
 __email__   = 'avs070518@gmail.com'
 __discord__ = 'Arrow#1334'
@@ -0,0 +1,252 @@
+"""
+automod.py
+"""
+
+from collections import (
+    deque
+)
+from storage import (
+    Codec
+)
+
+class TermMatcher:
+    """
+    Finds any of a set of terms in a text with an Aho-Corasick automaton
+
+    The text is read once, character by character, whatever the number of
+    terms, so the cost of a search depends on the length of the text and not
+    on the size of the lists. Matching ignores case. Words only match whole
+    words, phrases match anywhere in the text
+
+    A matcher is not modified once built, edited() returns a copy with only
+    the terms that changed added or removed. Building and editing both end
+    with a pass over the trie that computes the failure links, which takes
+    tens of milliseconds for lists of thousands of terms, so the Moderation
+    cog runs them on an executor thread
+    """
+
+    def __init__ (self, words: (str,) = (), phrases: (str,) = ()):
+        # Node 0 is the root. Transitions, failure links and, for nodes that
+        # end a term, the term and whether it is a whole word
+        self._goto = [{}]
+        self._fail = [0]
+        self._term = [None]
+        self._word = [False]
+
+        # Nearest node along the failure links that ends a term, including the node itself
+        self._output = [0]
+
+        self.words   = set()
+        self.phrases = set()
+
+        for word in words:
+            self._add(word, True)
+        for phrase in phrases:
+            self._add(phrase, False)
+        self._link()
+
+    def __len__ (self) -> int:
+        return len(self.words) + len(self.phrases)
+
+    def edited (self, words: (str,), phrases: (str,)) -> 'TermMatcher':
+        """Returns a copy of the matcher with the given terms, only the terms that differ are added or removed"""
+
+        words   = {word.casefold() for word in words}
+        phrases = {phrase.casefold() for phrase in phrases}
+
+        matcher         = TermMatcher.__new__(TermMatcher)
+        matcher._goto   = [dict(transitions) for transitions in self._goto]
+        matcher._fail   = list(self._fail)
+        matcher._term   = list(self._term)
+        matcher._word   = list(self._word)
+        matcher._output = list(self._output)
+        matcher.words   = set(self.words)
+        matcher.phrases = set(self.phrases)
+
+        for word in self.words - words:
+            matcher._remove(word, True)
+        for phrase in self.phrases - phrases:
+            matcher._remove(phrase, False)
+        for word in words - self.words:
+            matcher._add(word, True)
+        for phrase in phrases - self.phrases:
+            matcher._add(phrase, False)
+
+        matcher._link()
+        return matcher
+
+    def _add (self, term: str, word: bool) -> None:
+        term = term.casefold()
+        if len(term) == 0:
+            return
+
+        node = 0
+        for character in term:
+            child = self._goto[node].get(character)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][character] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._term.append(None)
+                self._word.append(False)
+                self._output.append(0)
+            node = child
+
+        (self.words if word else self.phrases).add(term)
+
+        # A term that is both a word and a phrase matches as a phrase
+        self._term[node] = term
+        self._word[node] = term not in self.phrases
+
+    def _remove (self, term: str, word: bool) -> None:
+        term  = term.casefold()
+        terms = self.words if word else self.phrases
+
+        if term not in terms:
+            return
+        terms.discard(term)
+
+        node = 0
+        for character in term:
+            node = self._goto[node][character]
+
+        # The nodes are left in the trie, they only stop ending a term
+        if term not in self.words and term not in self.phrases:
+            self._term[node] = None
+        self._word[node] = term not in self.phrases
+
+    def _link (self) -> None:
+        queue = deque()
+
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while len(queue) > 0:
+            node = queue.popleft()
+            fail = self._fail[node]
+
+            self._output[node] = node if self._term[node] is not None else self._output[fail]
+
+            for character, child in self._goto[node].items():
+                state = fail
+                while state > 0 and character not in self._goto[state]:
+                    state = self._fail[state]
+                self._fail[child] = self._goto[state].get(character, 0)
+                queue.append(child)
+
+    @staticmethod
+    def _boundary (text: str, index: int) -> bool:
+        return index < 0 or index >= len(text) or not (text[index].isalnum() or text[index] == '_')
+
+    def find (self, text: str) -> str:
+        """Returns the first term found in the text, None if there is none"""
+
+        goto   = self._goto
+        fail   = self._fail
+        output = self._output
+        text   = text.casefold()
+        state  = 0
+
+        for index, character in enumerate(text):
+            while state > 0 and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+
+            match = output[state]
+            while match > 0:
+                term = self._term[match]
+                if not self._word[match] or (self._boundary(text, index - len(term)) and self._boundary(text, index + 1)):
+                    return term
+                match = output[fail[match]]
+
+        return None
+
+class AutomodConfig:
+    """
+    Automod settings of a single guild
+
+    Like GuildConfig, a record in Knight.automod_configs is never modified in
+    place, a changed copy made with replace() is assigned instead. The term
+    sets are replaced rather than modified too, the Moderation cog brings its
+    matchers up to date by comparing them with the sets they were built from
+    """
+
+    __slots__ = (
+        'guild_id',
+        'words',
+        'phrases',
+        'actions',
+        'spam_actions',
+        'raid_actions'
+    )
+
+    # What is done with a message that contains a term
+    ACTIONS = ('delete', 'warn', 'kick', 'ban')
+
+    # What is done with a member that floods or spams mentions, and with the
+    # members that joined during a raid. No actions turn the detector off
+    SPAM_ACTIONS = ('purge', 'warn', 'kick', 'ban')
+    RAID_ACTIONS = ('kick', 'ban')
+
+    def __init__ (self, guild_id: int, words: frozenset = frozenset(), phrases: frozenset = frozenset(), actions: (str,) = ('delete',),
+                  spam_actions: (str,) = (), raid_actions: (str,) = ()):
+        self.guild_id     = guild_id
+        self.words        = words
+        self.phrases      = phrases
+        self.actions      = actions
+        self.spam_actions = spam_actions
+        self.raid_actions = raid_actions
+
+    @classmethod
+    def from_json (cls, guild_id: int, data: dict) -> 'AutomodConfig':
+        return cls(guild_id,
+                   words        = frozenset(data.get('words', ())),
+                   phrases      = frozenset(data.get('phrases', ())),
+                   actions      = tuple(data.get('actions', ('delete',))),
+                   spam_actions = tuple(data.get('spam_actions', ())),
+                   raid_actions = tuple(data.get('raid_actions', ())))
+
+    def replace (self, **fields) -> 'AutomodConfig':
+        """Returns a copy with the given fields changed"""
+
+        values = {slot: getattr(self, slot) for slot in self.__slots__}
+        values.update(fields)
+        return AutomodConfig(**values)
+
+    def to_json (self) -> dict:
+        data = {
+            'words'  : sorted(self.words),
+            'phrases': sorted(self.phrases),
+            'actions': list(self.actions)
+        }
+
+        if len(self.spam_actions) > 0:
+            data['spam_actions'] = list(self.spam_actions)
+        if len(self.raid_actions) > 0:
+            data['raid_actions'] = list(self.raid_actions)
+
+        return data
+
+    def __repr__ (self) -> str:
+        return f'<AutomodConfig guild_id={self.guild_id} words={len(self.words)} phrases={len(self.phrases)} actions={self.actions}>'
+
+class AutomodConfigCodec (Codec):
+    """Stores AutomodConfig records in automod.json, keyed by guild ID"""
+
+    @staticmethod
+    def decode_key (key: str) -> int:
+        return int(key)
+
+    @staticmethod
+    def encode_key (key: int) -> str:
+        return str(key)
+
+    @staticmethod
+    def decode (key: int, value: dict) -> AutomodConfig:
+        return AutomodConfig.from_json(key, value)
+
+    @staticmethod
+    def encode (value: AutomodConfig) -> dict:
+        return value.to_json()
@@ -0,0 +1,129 @@
+"""
+cases.py
+"""
+
+import sqlite3
+import threading
+import time
+
+class CaseStore:
+    """
+    Moderation cases in an SQLite database
+
+    Every kick and ban is a case with a number that counts up per guild. Cases
+    are keyed by guild and number, and indexed by target and by moderator, so
+    looking up a case or the history of a user reads only the rows asked for,
+    however many cases a guild has. The number of cases per guild, moderator
+    and action is kept up to date in a separate table for modstats
+
+    Methods block, they are meant to be run on executor threads. Calls never
+    overlap, a lock serialises them on one connection
+    """
+
+    def __init__ (self, path: str):
+        self.path = path
+
+        self._connection = None
+        self._lock       = threading.Lock()
+
+    def _connect (self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, isolation_level = None, check_same_thread = False)
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.execute('PRAGMA synchronous = NORMAL')
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS cases (
+                    guild     INTEGER NOT NULL,
+                    number    INTEGER NOT NULL,
+                    action    TEXT    NOT NULL,
+                    target    INTEGER NOT NULL,
+                    moderator INTEGER NOT NULL,
+                    reason    TEXT    NOT NULL,
+                    timestamp REAL    NOT NULL,
+                    PRIMARY KEY (guild, number)
+                ) WITHOUT ROWID;
+
+                CREATE INDEX IF NOT EXISTS cases_target    ON cases (guild, target, number);
+                CREATE INDEX IF NOT EXISTS cases_moderator ON cases (guild, moderator, number);
+
+                CREATE TABLE IF NOT EXISTS case_counts (
+                    guild     INTEGER NOT NULL,
+                    moderator INTEGER NOT NULL,
+                    action    TEXT    NOT NULL,
+                    count     INTEGER NOT NULL,
+                    PRIMARY KEY (guild, moderator, action)
+                ) WITHOUT ROWID;
+            ''')
+        return self._connection
+
+    def add (self, guild_id: int, action: str, targets: [int], moderator: int, reason: str, timestamp: float = None) -> [int]:
+        """Records one case per target in a single transaction, returns their numbers"""
+
+        if len(targets) == 0:
+            return []
+
+        timestamp = time.time() if timestamp is None else timestamp
+
+        with self._lock:
+            connection = self._connect()
+
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+
+                # The primary key makes this a single lookup
+                last, = connection.execute('SELECT max(number) FROM cases WHERE guild = ?', (guild_id,)).fetchone()
+                numbers = list(range((last or 0) + 1, (last or 0) + 1 + len(targets)))
+
+                connection.executemany('INSERT INTO cases (guild, number, action, target, moderator, reason, timestamp) '
+                                       'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                       [(guild_id, number, action, target, moderator, reason, timestamp)
+                                        for number, target in zip(numbers, targets)])
+                connection.execute('''
+                    INSERT INTO case_counts (guild, moderator, action, count) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (guild, moderator, action) DO UPDATE SET count = count + excluded.count
+                ''', (guild_id, moderator, action, len(targets)))
+
+        return numbers
+
+    def get (self, guild_id: int, number: int) -> tuple:
+        """Returns the (number, action, target, moderator, reason, timestamp) of a case, None if it does not exist"""
+
+        with self._lock:
+            return self._connect().execute('SELECT number, action, target, moderator, reason, timestamp FROM cases '
+                                           'WHERE guild = ? AND number = ?', (guild_id, number)).fetchone()
+
+    def history (self, guild_id: int, target: int, offset: int = 0, limit: int = 10) -> ([tuple], int):
+        """Returns up to `limit` cases of a user, newest first, after skipping `offset` of them, and how many cases the user has"""
+
+        with self._lock:
+            connection = self._connect()
+
+            total, = connection.execute('SELECT count(*) FROM cases WHERE guild = ? AND target = ?', (guild_id, target)).fetchone()
+
+            # Without statistics SQLite prefers walking the guild's cases in
+            # primary key order, which reads every case of the guild
+            rows = connection.execute('SELECT number, action, target, moderator, reason, timestamp FROM cases INDEXED BY cases_target '
+                                      'WHERE guild = ? AND target = ? ORDER BY number DESC LIMIT ? OFFSET ?',
+                                      (guild_id, target, limit, offset)).fetchall()
+
+        return rows, total
+
+    def stats (self, guild_id: int) -> {int: {str: int}}:
+        """Returns the number of cases of every action by moderator ID"""
+
+        with self._lock:
+            rows = self._connect().execute('SELECT moderator, action, count FROM case_counts WHERE guild = ?', (guild_id,))
+
+            counts = {}
+            for moderator, action, count in rows:
+                counts.setdefault(moderator, {})[action] = count
+
+        return counts
+
+    def close (self) -> None:
+        """Closes the connection, it is reopened when needed"""
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
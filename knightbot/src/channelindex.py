@@ -0,0 +1,48 @@
+"""
+channelindex.py
+"""
+
+class GuildChannelIndex:
+    """
+    Maps guild IDs to their resolved admin and log channels
+
+    Guilds are resolved once and kept until invalidated by a channel event or a
+    change to admin.json. Guilds without configured channels are stored too, as
+    (None, None), so repeated lookups for them cost a single dict lookup as well
+    """
+
+    _MISSING = (None, None)
+
+    def __init__ (self, resolve):
+        """
+        :param: resolve
+            function taking a guild and returning its (admin, log) channels,
+            None for a channel that does not exist
+        """
+
+        self._resolve = resolve
+        self._entries = {}
+
+    def get (self, guild) -> tuple:
+        entry = self._entries.get(guild.id)
+
+        if entry is None:
+            entry = self._resolve(guild)
+
+            if entry[0] is None and entry[1] is None:
+                entry = self._MISSING
+            self._entries[guild.id] = entry
+
+        return entry
+
+    def get_admin (self, guild):
+        return self.get(guild)[0]
+
+    def get_log (self, guild):
+        return self.get(guild)[1]
+
+    def invalidate (self, guild_id: int) -> None:
+        self._entries.pop(guild_id, None)
+
+    def clear (self) -> None:
+        self._entries.clear()
@@ -32,6 +32,9 @@ def initialise () -> None:
         content = prefix.read()
         _constants.update(json.loads(content))
 
+def get_prefix_file () -> str:
+    return _prefix_location
+
 def get_custom_prefix () -> dict:
     return _constants['custom_prefix']
 
@@ -50,6 +53,98 @@ def get_support () -> str:
 def get_token () -> str:
     return _constants['token']
 
+def get_cache_backend () -> str:
+    """Returns the storage backend for cache files, either 'json' or 'sqlite'"""
+    return _constants.get('cache_backend', 'json')
+
+def get_snapshot_retention () -> int:
+    """Returns the number of cache snapshots to keep"""
+    return int(_constants.get('snapshot_retention', 7))
+
+def get_sweep_concurrency () -> int:
+    """Returns the number of guilds provisioned at once during the cache update"""
+    return int(_constants.get('sweep_concurrency', 8))
+
+def get_sweep_rate () -> int:
+    """Returns the number of API requests per second the cache update may make"""
+    return int(_constants.get('sweep_rate', 25))
+
+def get_memory_profile () -> str:
+    """Returns the memory profile, either 'full' or 'low'"""
+    return _constants.get('memory_profile', 'full')
+
+def get_log_flush_interval () -> float:
+    """Returns the number of seconds log lines are collected before being written"""
+    return float(_constants.get('log_flush_interval', 1.0))
+
+def get_log_queue_size () -> int:
+    return int(_constants.get('log_queue_size', 10000))
+
+def get_log_overflow () -> str:
+    """Returns what happens to log lines when the log queue is full, one of 'block', 'drop_oldest' or 'drop'"""
+    return _constants.get('log_overflow', 'block')
+
+def get_log_format () -> str:
+    """Returns the format of the log file, either 'text' or 'jsonl'"""
+    return _constants.get('log_format', 'text')
+
+def get_log_max_bytes () -> int:
+    """Returns the size at which the log file is rotated, 0 disables rotation by size"""
+    return int(_constants.get('log_max_bytes', 64 * 1024 * 1024))
+
+def get_log_rotate_daily () -> bool:
+    return bool(_constants.get('log_rotate_daily', True))
+
+def get_log_level () -> str:
+    """Returns the name of the category below which messages are not logged, one of DEBUG, INFO or ERROR"""
+    return str(_constants.get('log_level', 'DEBUG')).upper()
+
+def get_log_index () -> bool:
+    """Returns whether log records are also written to the searchable log index"""
+    return bool(_constants.get('log_index', False))
+
+def get_log_index_retention () -> int:
+    """Returns the number of days kept in the log index, 0 keeps every day"""
+    return int(_constants.get('log_index_retention', 30))
+
+def get_message_store_bytes () -> int:
+    """Returns the memory budget of the deleted message store, 0 disables it"""
+    return int(_constants.get('message_store_bytes', 32 * 1024 * 1024))
+
+def get_message_store_per_channel () -> int:
+    return int(_constants.get('message_store_per_channel', 500))
+
+def get_message_store_compress_above () -> int:
+    """Returns the length above which stored message content is compressed, -1 disables compression"""
+    return int(_constants.get('message_store_compress_above', 128))
+
+def get_transcript_format () -> str:
+    """Returns the format of purge transcripts, either 'text' or 'jsonl'"""
+    return _constants.get('transcript_format', 'text')
+
+def get_transcript_keep () -> bool:
+    """Returns whether purge transcripts are kept in the transcript directory after being sent"""
+    return bool(_constants.get('transcript_keep', False))
+
+def get_flood_rate () -> (int, float):
+    """Returns how many messages of a member within how many seconds are a flood"""
+    messages, seconds = _constants.get('flood_rate', (6, 5.0))
+    return int(messages), float(seconds)
+
+def get_mention_rate () -> (int, float):
+    """Returns how many mentions by a member within how many seconds are mention spam"""
+    mentions, seconds = _constants.get('mention_rate', (10, 10.0))
+    return int(mentions), float(seconds)
+
+def get_join_rate () -> (int, float):
+    """Returns how many members joining a guild within how many seconds are a raid"""
+    joins, seconds = _constants.get('join_rate', (10, 10.0))
+    return int(joins), float(seconds)
+
+def get_spam_tracked_keys () -> int:
+    """Returns how many members or guilds every spam and raid detector tracks at most"""
+    return int(_constants.get('spam_tracked_keys', 100000))
+
 def get_cache_directory () -> str:
     return '../resources/cache'
 
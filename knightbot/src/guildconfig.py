@@ -0,0 +1,93 @@
+"""
+guildconfig.py
+"""
+
+from storage import (
+    Codec
+)
+
+class GuildConfig:
+    """
+    Knight settings of a single guild
+
+    IDs are kept as ints, they are converted to strings only when admin.json
+    is written. A GuildConfig in Knight.guild_configs is never modified in
+    place, the storage backend may be encoding it on another thread. A
+    changed copy is assigned instead, which also saves the change:
+
+        config = bot.guild_configs[guild.id]
+        bot.guild_configs[guild.id] = config.replace(log = channel.id)
+    """
+
+    __slots__ = (
+        'guild_id',
+        'admin',
+        'log',
+        'muted',
+        'level'
+    )
+
+    def __init__ (self, guild_id: int, admin: int = None, log: int = None, muted: frozenset = frozenset(), level: int = 0):
+        self.guild_id = guild_id
+        self.admin    = admin
+        self.log      = log
+
+        # Log categories whose broadcasts are not sent to this guild
+        self.muted = muted
+
+        # Minimum level of the messages sent to the log channel
+        self.level = level
+
+    @classmethod
+    def from_json (cls, guild_id: int, data: dict) -> 'GuildConfig':
+        admin = data.get('admin')
+        log   = data.get('log')
+
+        return cls(guild_id,
+                   admin = None if admin is None else int(admin),
+                   log   = None if log is None else int(log),
+                   muted = frozenset(data.get('muted', ())),
+                   level = int(data.get('level', 0)))
+
+    def replace (self, **fields) -> 'GuildConfig':
+        """Returns a copy with the given fields changed"""
+
+        values = {slot: getattr(self, slot) for slot in self.__slots__}
+        values.update(fields)
+        return GuildConfig(**values)
+
+    def to_json (self) -> dict:
+        data = {}
+
+        if self.admin is not None:
+            data['admin'] = str(self.admin)
+        if self.log is not None:
+            data['log'] = str(self.log)
+        if len(self.muted) > 0:
+            data['muted'] = sorted(self.muted)
+        if self.level > 0:
+            data['level'] = self.level
+
+        return data
+
+    def __repr__ (self) -> str:
+        return f'<GuildConfig guild_id={self.guild_id} admin={self.admin} log={self.log}>'
+
+class GuildConfigCodec (Codec):
+    """Stores GuildConfig records in admin.json, keyed by guild ID"""
+
+    @staticmethod
+    def decode_key (key: str) -> int:
+        return int(key)
+
+    @staticmethod
+    def encode_key (key: int) -> str:
+        return str(key)
+
+    @staticmethod
+    def decode (key: int, value: dict) -> GuildConfig:
+        return GuildConfig.from_json(key, value)
+
+    @staticmethod
+    def encode (value: GuildConfig) -> dict:
+        return value.to_json()
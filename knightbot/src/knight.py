@@ -2,11 +2,13 @@
 knight.py
 """
 
-import aioshutil
+import asyncio
 import constants
 import datetime
-import json
 import os
+import shutil
+import tempfile
+import time
 import traceback
 
 from discord import (
@@ -14,11 +16,16 @@ from discord import (
     Color,
     Embed,
     Guild,
-    Intents,
     Invite,
     Message,
+    RawBulkMessageDeleteEvent,
+    RawMessageDeleteEvent,
+    TextChannel,
     utils
 )
+from discord.abc import (
+    GuildChannel
+)
 from discord.ext.commands import (
     Bot,
     Context
@@ -26,61 +33,173 @@ from discord.ext.commands import (
 from discord.ext.tasks import (
     loop
 )
+from automod import (
+    AutomodConfigCodec
+)
+from cases import (
+    CaseStore
+)
+from channelindex import (
+    GuildChannelIndex
+)
+from guildconfig import (
+    GuildConfig,
+    GuildConfigCodec
+)
 from logger import (
+    CATEGORIES,
+    DEBUG,
     ERROR,
     INFO,
     FileLogger,
     ChannelLogger,
     CommonLogger
 )
+from logindex import (
+    LogIndex
+)
+from messagestore import (
+    MessageStore
+)
+from persistence import (
+    DebouncedWriter,
+    atomic_write_json
+)
+from prefix import (
+    PrefixResolver
+)
+from profiles import (
+    client_options
+)
+from purge import (
+    RecentIds
+)
+from ratelimit import (
+    RateLimiter
+)
+from snapshot import (
+    SnapshotStore
+)
+from transcript import (
+    TranscriptWriter
+)
+from storage import (
+    CacheTable,
+    JSONStorage,
+    SQLiteStorage
+)
 
 # noinspection PyUnusedLocal
 def UNUSED (*args, **kwargs):
     pass
 
-async def _command_prefix_callback (bot: Bot, message: Message) -> [str]:
-    user_id = bot.user.id
+async def _command_prefix_callback (bot: Bot, message: Message) -> (str,):
     guild = message.guild
-
-    prefixes = [f'<@!{user_id}>', f'<@{user_id}>']
-
-    # Only allows custom prefixes in guilds
-    if guild is not None:
-        prefixes.extend(constants.get_custom_prefix().get(guild.id, constants.get_default_prefix()))
-    else:
-        prefixes.extend([constants.get_default_prefix()])
-
-    return prefixes
+    return bot.prefix_resolver.resolve(None if guild is None else guild.id)
 
 class Knight (Bot):
     _cache_directory        = '../resources/cache'
     _cache_backup_directory = '../resources/cache_backup'
+    _cache_database         = os.path.join(_cache_directory, 'cache.sqlite3')
+
+    # Outside the cache directory, so that cache snapshots neither copy nor
+    # restore the cases and the kept transcripts
+    _case_database        = '../resources/cases.sqlite3'
+    _transcript_directory = '../resources/transcripts'
+
+    _log_file  = os.path.join(constants.get_log_directory(), 'logs.txt')
+    _log_index = os.path.join(constants.get_log_directory(), 'logs.sqlite3')
+
+    # Seconds to wait for further changes before writing prefix.json and the cache
+    _prefix_save_delay = 10
+    _cache_save_delay  = 5
 
-    _log_file = os.path.join(constants.get_log_directory(), 'logs.txt')
+    # IDs of messages deleted by Knight that are remembered
+    _deleted_messages_size = 10000
 
     def __init__ (self):
         super().__init__(command_prefix     = _command_prefix_callback,
                          description        = f'{constants.get_name()} is a Multipurpose Discord Bot',
-                         intents            = Intents.all(),
                          owner_id           = constants.get_owner(),
                          case_insensitive   = True,
-                         strip_after_prefix = True)
-
-        self.file_logger    = FileLogger(self, self._log_file)
-        self.channel_logger = ChannelLogger(self)
+                         strip_after_prefix = True,
+                         **client_options(constants.get_memory_profile()))
+
+        log_format = constants.get_log_format()
+        log_file   = self._log_file if log_format == 'text' else os.path.splitext(self._log_file)[0] + '.jsonl'
+        log_level  = constants.get_log_level()
+
+        if log_level not in CATEGORIES:
+            raise Exception(f'Unknown log level "{log_level}", expected one of {", ".join(CATEGORIES)}')
+
+        # Searchable copy of the log, see LogIndex
+        self.log_index = LogIndex(self._log_index, constants.get_log_index_retention()) if constants.get_log_index() else None
+
+        self.file_logger    = FileLogger(self, log_file,
+                                         flush_interval = constants.get_log_flush_interval(),
+                                         max_queue      = constants.get_log_queue_size(),
+                                         overflow       = constants.get_log_overflow(),
+                                         format         = log_format,
+                                         max_bytes      = constants.get_log_max_bytes(),
+                                         rotate_daily   = constants.get_log_rotate_daily(),
+                                         level          = CATEGORIES[log_level].level,
+                                         index          = self.log_index)
+        self.channel_logger = ChannelLogger(self, level = CATEGORIES[log_level].level)
         self.common_logger  = CommonLogger(self.file_logger, self.channel_logger)
 
+        self.prefix_resolver = PrefixResolver(constants.get_default_prefix(), constants.get_custom_prefix())
+        self.prefix_writer   = DebouncedWriter(self.save_prefixes, self._prefix_save_delay)
+
         self.start_time = datetime.datetime.utcnow().replace(microsecond = 0)
 
-        self.cache_files = [
+        # Cache files and the codec of their entries
+        self.cache_files = {
             # Channel IDs for Knight Admin and Knight Log for every guild
-            'admin.json'
-        ]
+            'admin.json'  : GuildConfigCodec,
 
-        self.cache = {}
+            # Automod term lists and actions for every guild that set them
+            'automod.json': AutomodConfigCodec
+        }
+
+        self.storage      = None
+        self.cache        = {}
+        self.cache_writer = DebouncedWriter(self.write_cache, self._cache_save_delay)
         self.initialise_cache()
 
+        # Recent messages, to show the content of deleted messages that are no
+        # longer in discord.py's message cache
+        store_bytes    = constants.get_message_store_bytes()
+        compress_above = constants.get_message_store_compress_above()
+
+        self.message_store = None
+        if store_bytes > 0:
+            self.message_store = MessageStore(store_bytes,
+                                              per_channel    = constants.get_message_store_per_channel(),
+                                              compress_above = None if compress_above < 0 else compress_above)
+
+        # Messages deleted by Knight itself, their delete events are not logged
+        self.deleted_messages = RecentIds(self._deleted_messages_size)
+
+        # Kicks and bans with their case numbers
+        self.cases = CaseStore(self._case_database)
+
+        self.channel_index = GuildChannelIndex(self._admin_channels)
+
+        # Guilds whose Knight Bot channels are being created, mapped to whether
+        # another check was requested while doing so
+        self._provisioning = {}
+
+        # SQLite WAL files are checkpointed into the database before a snapshot
+        self.snapshots = SnapshotStore(self._cache_backup_directory,
+                                       constants.get_snapshot_retention(),
+                                       ignore = ('-wal', '-shm', '.tmp'))
+
     async def on_ready (self) -> None:
+        self.prefix_resolver.build(self.user.id)
+
+        # A new session comes with new guild and channel objects
+        self.channel_index.clear()
+
         self.backup_cache.start()
         self.update_cache.start()
 
@@ -97,13 +216,34 @@ class Knight (Bot):
         await self.common_logger.guild_specific_log(ctx.guild, ERROR, _pretty_exception)
 
     async def on_guild_join (self, guild: Guild):
-        UNUSED(guild)
-        await self.update_cache()
+        await self.provision_guild(guild)
+
+    async def on_guild_available (self, guild: Guild):
+        self.channel_index.invalidate(guild.id)
+
+    async def on_guild_channel_delete (self, channel: GuildChannel):
+        self.channel_logger.forget(channel.id)
+        if self.message_store is not None:
+            self.message_store.remove_channel(channel.id)
+
+        # The index may not have resolved the guild before the channel was removed
+        if channel.id in self._admin_channel_ids(channel.guild):
+            self.channel_index.invalidate(channel.guild.id)
+            await self.provision_guild(channel.guild)
+
+    async def on_guild_channel_update (self, before: GuildChannel, after: GuildChannel):
+        UNUSED(before)
+        if after.id in self._admin_channel_ids(after.guild):
+            self.channel_index.invalidate(after.guild.id)
+            await self.provision_guild(after.guild)
 
     async def on_guild_remove (self, guild: Guild):
-        if str(guild.id) in self.cache['admin.json'].keys():
-            self.cache['admin.json'].pop(str(guild.id))
-        await self.update_cache()
+        self.channel_index.invalidate(guild.id)
+
+        for configs in (self.guild_configs, self.automod_configs):
+            if guild.id in configs:
+                configs.pop(guild.id)
+                self.cache_writer.schedule()
 
     async def on_invite_create (self, invite: Invite):
         embed = Embed(color     = Color.green(),
@@ -136,33 +276,126 @@ class Knight (Bot):
                         value  = invite.temporary,
                         inline = False)
 
-        log_channel = int(self.cache['admin.json'][str(invite.guild.id)]['log'])
-        channel = utils.find(lambda c: c.id == log_channel, invite.guild.channels)
-        await channel.send(embed = embed)
+        channel = self.get_log_channel(invite.guild)
+        if channel is not None:
+            await channel.send(embed = embed)
+
+    async def on_message (self, message: Message):
+        # DMs have no log channel to report deletes to
+        if self.message_store is not None and message.guild is not None:
+            self.message_store.add(message)
+
+        await self.process_commands(message)
+
+    async def on_raw_message_delete (self, payload: RawMessageDeleteEvent):
+        # Messages in DMs have no log channel
+        if payload.guild_id is None:
+            return
 
-    async def on_message_delete (self, message: Message):
-        if message is None:
-            message = ' '
+        stored = None if self.message_store is None else self.message_store.pop(payload.channel_id, payload.message_id)
+
+        if self.deleted_messages.discard(payload.message_id):
+            return
+
+        guild = self.get_guild(payload.guild_id)
+
+        channel = None if guild is None else self.get_log_channel(guild)
+        if channel is None:
+            return
 
         embed = Embed(title       = 'Message Deleted!',
                       timestamp   = constants.get_current_time(),
                       type        = 'rich')
 
-        embed.set_author(name     = message.author.name,
-                         icon_url = message.author.avatar_url)
-
+        # discord.py's cache has the full message, the store a compact copy
+        message = payload.cached_message
+        if message is not None:
+            embed.set_author(name     = message.author.name,
+                             icon_url = message.author.avatar_url)
+            content = message.content
+        elif stored is not None:
+            embed.set_author(name = stored.author)
+            content = stored.content
+        else:
+            content = '*Not cached*'
+
+        # Field values cannot be empty or longer than 1024 characters
         embed.add_field(name   = 'Content',
-                        value  = message.content,
+                        value  = content[:1024] or '*No text*',
                         inline = False)
 
         embed.add_field(name   = 'Message ID',
-                        value  = message.id,
+                        value  = payload.message_id,
+                        inline = False)
+
+        embed.add_field(name   = 'Channel',
+                        value  = f'<#{payload.channel_id}>',
                         inline = False)
 
-        log_channel = int(self.cache['admin.json'][str(message.guild.id)]['log'])
-        channel = utils.find(lambda c: c.id == log_channel, message.guild.channels)
         await channel.send(embed = embed)
 
+    async def on_raw_bulk_message_delete (self, payload: RawBulkMessageDeleteEvent):
+        # Messages in DMs have no log channel
+        if payload.guild_id is None:
+            return
+
+        cached  = {message.id: message for message in payload.cached_messages}
+        stored  = {}
+        deleted = []
+
+        for message_id in sorted(payload.message_ids):
+            record = None if self.message_store is None else self.message_store.pop(payload.channel_id, message_id)
+
+            # Knight's own purges log a transcript of their own
+            if self.deleted_messages.discard(message_id):
+                continue
+
+            deleted.append(message_id)
+            if record is not None:
+                stored[message_id] = record
+
+        guild = self.get_guild(payload.guild_id)
+        if len(deleted) == 0 or guild is None:
+            return
+
+        # One entry with a transcript instead of one embed per message
+        with self.open_transcript(f'bulk-{payload.channel_id}-{deleted[0]}') as transcript:
+            for message_id in deleted:
+                if message_id in cached:
+                    transcript.write(cached[message_id])
+                elif message_id in stored:
+                    transcript.write_stored(stored[message_id])
+                else:
+                    transcript.write_missing(message_id)
+
+        channel   = guild.get_channel(payload.channel_id)
+        recovered = sum(1 for message_id in deleted if message_id in cached or message_id in stored)
+        message   = (f'```\n{len(deleted)} messages were bulk deleted in #{payload.channel_id if channel is None else channel.name}, '
+                     f'{recovered} of them were cached```')
+
+        await self.send_transcript(guild, message, transcript)
+
+    async def delete_message (self, message: Message) -> None:
+        """Deletes a message without logging its delete event"""
+
+        self.deleted_messages.add(message.id)
+        await message.delete()
+
+    async def record_cases (self, guild: Guild, action: str, targets: [int], moderator: int, reason: str) -> [int]:
+        """Adds a case for every target without blocking the event loop, returns the case numbers"""
+
+        return await asyncio.get_event_loop().run_in_executor(None, self.cases.add, guild.id, action, targets, moderator, reason)
+
+    @property
+    def guild_configs (self) -> CacheTable:
+        """GuildConfig records keyed by guild ID"""
+        return self.cache['admin.json']
+
+    @property
+    def automod_configs (self) -> CacheTable:
+        """AutomodConfig records keyed by guild ID"""
+        return self.cache['automod.json']
+
     @property
     def latency_ms (self) -> str:
         """Returns the latency of the bot in milliseconds"""
@@ -174,74 +407,241 @@ class Knight (Bot):
 
         return str(constants.get_current_time() - self.start_time)
 
+    async def save_prefixes (self) -> None:
+        """Writes the custom prefixes to prefix.json without blocking the event loop"""
+
+        # to_json() builds a fresh dict, so it can be serialised on another thread
+        await asyncio.get_event_loop().run_in_executor(None, atomic_write_json, constants.get_prefix_file(), self.prefix_resolver.to_json())
+
     def initialise_cache (self) -> None:
-        """Reads the cache files and initialises bot cache"""
+        """Opens the cache storage backend and initialises bot cache"""
+
+        if constants.get_cache_backend() == 'sqlite':
+            self.storage = SQLiteStorage(self._cache_database)
 
-        for file in self.cache_files:
-            _cache_file = os.path.join(self._cache_directory, file)
+            # Existing JSON cache files are imported once when switching backends
+            for file in self.cache_files:
+                self.storage.migrate(file, os.path.join(self._cache_directory, file))
+        else:
+            self.storage = JSONStorage(self._cache_directory)
 
-            if not os.path.exists(_cache_file):
-                with open(_cache_file, 'w', encoding = 'utf-8') as f:
-                    f.write('{}')
+        for file, codec in self.cache_files.items():
+            self.cache[file] = CacheTable(file, self.storage, codec)
 
-            with open(_cache_file, 'r', encoding = 'utf-8') as f:
-                content = json.loads(f.read())
+    async def write_cache (self) -> None:
+        """Writes the changed cache entries to the storage backend without blocking the event loop"""
 
-            self.cache[file] = content
+        changes = self.storage.collect()
+        if changes is None:
+            return
 
-    def update_cache_file (self) -> None:
-        """Updates the cache files"""
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self.storage.write, changes)
+        except Exception as exception:
+            # Kept for the next write instead of being lost with the failed one
+            self.storage.requeue(changes)
+            self.cache_writer.schedule()
+            await self.file_logger.log(ERROR, f'Could not write the cache, retrying in {self._cache_save_delay}s: {exception!r}')
 
-        for file in self.cache_files:
-            _cache_file = os.path.join(self._cache_directory, file)
+    async def update_cache_file (self) -> None:
+        """Writes pending cache changes immediately instead of waiting for the scheduled write"""
 
-            with open(_cache_file, 'w', encoding = 'utf-8') as f:
-                f.write(json.dumps(self.cache[file], indent = 4))
+        await self.cache_writer.flush()
+
+    def _create_snapshot (self) -> (str, int):
+        self.storage.checkpoint()
+        return self.snapshots.create(self._cache_directory)
+
+    async def snapshot_cache (self) -> (str, int):
+        """Writes pending cache changes and takes a snapshot of the cache directory"""
+
+        await self.update_cache_file()
+
+        async with self.cache_writer.lock:
+            return await asyncio.get_event_loop().run_in_executor(None, self._create_snapshot)
+
+    def _restore_snapshot (self, snapshot_id: str) -> (int, int):
+        self.storage.close()
+
+        restored = self.snapshots.restore(snapshot_id, self._cache_directory)
+
+        # A leftover WAL would be replayed on top of the restored database
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self._cache_database + suffix):
+                os.remove(self._cache_database + suffix)
+
+        return restored
+
+    async def restore_cache (self, snapshot_id: str) -> (int, int):
+        """
+        Replaces the cache with a snapshot, changes that have not been written
+        yet are discarded. Returns the number of files restored and removed
+        """
+
+        async with self.cache_writer.lock:
+            self.storage.collect()
+            restored = await asyncio.get_event_loop().run_in_executor(None, self._restore_snapshot, snapshot_id)
+
+            self.cache = {}
+            self.initialise_cache()
+            self.channel_index.clear()
+
+        return restored
 
     @loop(hours = 24)
     async def backup_cache (self) -> None:
-        """Creates a backup of cache files"""
-
-        await aioshutil.copytree(src = self._cache_directory,
-                                 dst = self._cache_backup_directory,
-                                 dirs_exist_ok = True)
+        """Creates a snapshot of cache files"""
 
-        await self.common_logger.log(INFO, '```Periodic cache backup complete!```')
+        snapshot_id, changed = await self.snapshot_cache()
+        await self.common_logger.log(INFO, f'```Periodic cache backup complete! Snapshot {snapshot_id}, {changed} file(s) changed```')
 
     @loop(hours = 24)
     async def update_cache (self):
         await self.update_cache_admin()
         await self.common_logger.log(INFO, '```Cache update complete!```')
 
-        self.update_cache_file()
+    def _admin_channels (self, guild: Guild) -> (TextChannel, TextChannel):
+        """Returns the admin and log channels of a guild from admin.json, None for a channel that does not exist"""
+
+        config = self.guild_configs.get(guild.id)
+
+        if config is None:
+            return None, None
+        return guild.get_channel(config.admin), guild.get_channel(config.log)
+
+    def _admin_channel_ids (self, guild: Guild) -> (int,):
+        config = self.guild_configs.get(guild.id)
+        return () if config is None else (config.admin, config.log)
+
+    def get_log_channel (self, guild: Guild) -> TextChannel:
+        return self.channel_index.get_log(guild)
+
+    def open_transcript (self, name: str) -> TranscriptWriter:
+        """Starts a transcript of deleted messages, kept in the transcript directory if 'transcript_keep' is set"""
+
+        directory = self._transcript_directory if constants.get_transcript_keep() else tempfile.gettempdir()
+        return TranscriptWriter(directory, name, constants.get_transcript_format())
+
+    async def send_transcript (self, guild: Guild, message: str, transcript: TranscriptWriter) -> None:
+        """Logs a closed transcript with the file attached to the log channel of the guild"""
+
+        keep = constants.get_transcript_keep()
+
+        if transcript.size > guild.filesize_limit:
+            # Too large to attach, the transcript is kept instead
+            if not keep:
+                os.makedirs(self._transcript_directory, exist_ok = True)
+                shutil.move(transcript.path, self._transcript_directory)
+                keep = True
+
+            await self.common_logger.guild_specific_log(guild, INFO, '{}\nThe transcript of {} messages is too large to attach, it has been kept as {}',
+                                                        message, transcript.count, os.path.basename(transcript.path))
+        else:
+            await self.common_logger.guild_specific_file(guild, INFO, message, transcript.path)
+
+        if not keep:
+            os.remove(transcript.path)
+
+    async def provision_guild (self, guild: Guild, limiter: RateLimiter = None) -> bool:
+        """
+        Creates whichever of the Knight Bot category, admin and log channels of a guild are missing
+
+        Checking a guild whose channels exist costs two dict lookups and no API
+        calls. Returns False if there was nothing to do
+        """
+
+        # A repair requested while one is running is done by the running one
+        if guild.id in self._provisioning:
+            self._provisioning[guild.id] = True
+            return False
+
+        _admin, _log = self._admin_channels(guild)
+
+        if _admin is not None and _log is not None:
+            return False
+
+        limiter = limiter or RateLimiter(constants.get_sweep_rate(), 1)
+        self._provisioning[guild.id] = True
+
+        try:
+            while self._provisioning[guild.id]:
+                self._provisioning[guild.id] = False
+
+                _admin, _log = self._admin_channels(guild)
+                if _admin is not None and _log is not None:
+                    break
+
+                # Prefer the category of a surviving channel over a lookup by name
+                knight_category: CategoryChannel = (_admin or _log).category if (_admin or _log) is not None else None
+
+                if knight_category is None:
+                    knight_category = utils.find(lambda category: category.name == 'KNIGHT BOT', guild.categories)
+
+                if knight_category is None:
+                    async with limiter:
+                        knight_category: CategoryChannel = await guild.create_category(name     = 'KNIGHT BOT',
+                                                                                       reason   = 'Knight Bot Admin and Log channels required',
+                                                                                       position = len(guild.categories))
+                    async with limiter:
+                        await knight_category.set_permissions(guild.default_role, read_messages = False)
+
+                if _admin is None:
+                    async with limiter:
+                        _admin = await knight_category.create_text_channel(name   = 'knightbot-admin',
+                                                                           topic  = 'Admin channel for Knight Bot',
+                                                                           reason = 'Channel for admin control of Knight Bot')
+
+                if _log is None:
+                    async with limiter:
+                        _log = await knight_category.create_text_channel(name   = 'knightbot-log',
+                                                                         topic  = 'Logging channel for Knight Bot',
+                                                                         reason = 'Channel for logging Knight Bot logs')
+
+                config = (self.guild_configs.get(guild.id) or GuildConfig(guild.id)).replace(admin = _admin.id, log = _log.id)
+
+                self.guild_configs[guild.id] = config
+                self.cache_writer.schedule()
+                self.channel_index.invalidate(guild.id)
+        finally:
+            self._provisioning.pop(guild.id)
+
+        return True
 
     async def update_cache_admin (self):
-        for guild in self.guilds:
-            guild: Guild = guild
-
-            knight_category: CategoryChannel = utils.find(lambda category: category.name == 'KNIGHT BOT', guild.categories)
-
-            if knight_category is None:
-                knight_category: CategoryChannel = await guild.create_category(name     = 'KNIGHT BOT',
-                                                                               reason   = 'Knight Bot Admin and Log channels required',
-                                                                               position = len(guild.categories))
-                await knight_category.set_permissions(guild.default_role, read_messages = False)
-
-            if str(guild.id) in self.cache['admin.json'].keys():
-                _admin = self.cache['admin.json'][str(guild.id)]['admin']
-                _log   = self.cache['admin.json'][str(guild.id)]['log']
-            else:
-                _admin = await knight_category.create_text_channel(name   = 'knightbot-admin',
-                                                                   topic  = 'Admin channel for Knight Bot',
-                                                                   reason = 'Channel for admin control of Knight Bot')
-
-                _log = await knight_category.create_text_channel(name   = 'knightbot-log',
-                                                                 topic  = 'Logging channel for Knight Bot',
-                                                                 reason = 'Channel for logging Knight Bot logs')
-
-                self.cache['admin.json'][str(guild.id)] = {
-                    "admin": str(_admin.id),
-                    "log": str(_log.id)
-                }
-
-        await self.common_logger.log(INFO, '```Cache update for admin.json complete!```')
+        """
+        Checks every guild and repairs those with missing channels
+
+        Channel events repair guilds as soon as something breaks, so this is a
+        consistency check that rarely makes API calls. Repairs run concurrently,
+        paced to stay within Discord's rate limits
+        """
+
+        start     = time.perf_counter()
+        guilds    = list(self.guilds)
+        semaphore = asyncio.Semaphore(constants.get_sweep_concurrency())
+        limiter   = RateLimiter(constants.get_sweep_rate(), 1)
+
+        # Report progress roughly every 10% of guilds
+        report_every = max(len(guilds) // 10, 1)
+        done = created = failed = 0
+
+        async def sweep (guild: Guild) -> None:
+            nonlocal done, created, failed
+
+            async with semaphore:
+                try:
+                    if await self.provision_guild(guild, limiter):
+                        created += 1
+                except Exception as exception:
+                    failed += 1
+                    await self.file_logger.log(ERROR, f'Could not provision guild {guild.id}: {exception!r}')
+
+            done += 1
+            if done % report_every == 0:
+                await self.file_logger.log(DEBUG, 'Cache update for admin.json: {}/{} guilds', done, len(guilds))
+
+        await asyncio.gather(*(sweep(guild) for guild in guilds))
+
+        elapsed = time.perf_counter() - start
+        await self.common_logger.log(INFO, f'```Cache update for admin.json complete! {len(guilds)} guilds, '
+                                           f'{created} repaired, {failed} failed in {elapsed:.2f}s```')
@@ -1,13 +1,30 @@
+import asyncio
 import constants
+import datetime
+import gzip
+import json
+import os
+import shutil
+import time
 
 from abc import (
     abstractmethod
 )
+from concurrent.futures import (
+    ThreadPoolExecutor
+)
 from discord import (
     Color,
     Embed,
+    File,
     Guild,
-    utils
+    HTTPException
+)
+from logindex import (
+    LogIndex
+)
+from ratelimit import (
+    RateLimiter
 )
 
 _log_directory = '../resources/logs'
@@ -19,6 +36,11 @@ class _LoggerCategory:
     def color (self):
         return None
 
+    @property
+    def level (self) -> int:
+        """Severity of the category, messages below a logger's minimum level are dropped"""
+        return 0
+
     @property
     def name (self):
         """Returns the class name"""
@@ -29,17 +51,51 @@ class Debug (_LoggerCategory):
     def color (self):
         return Color.blue()
 
+    @property
+    def level (self) -> int:
+        return 10
+
 class Error (_LoggerCategory):
     @property
     def color (self):
         return Color.red()
 
+    @property
+    def level (self) -> int:
+        return 40
+
 class Info (_LoggerCategory):
     @property
     def color (self):
         return Color.green()
 
+    @property
+    def level (self) -> int:
+        return 20
+
 class _Logger:
+    # Minimum level of the messages that are logged
+    level = 0
+
+    def accepts (self, category: _LoggerCategory) -> bool:
+        return category.level >= self.level
+
+    @staticmethod
+    def render (message, args: tuple = ()) -> str:
+        """
+        Builds the text of a lazily formatted message
+
+        A message is a string, a string formatted with str.format(*args) or a
+        function returning the string. Loggers render a message only after it
+        passed their level check, so filtered messages are never built
+        """
+
+        if callable(message):
+            return message()
+        if len(args) > 0:
+            return message.format(*args)
+        return message
+
     @staticmethod
     def pretty (category: _LoggerCategory, message: str) -> str:
         return f'[{category.name} - {constants.get_current_time()}]: {message}\n'
@@ -49,66 +105,516 @@ class _Logger:
         raise Exception('Implementation of _Logger.log() not found')
 
 class FileLogger (_Logger):
-    """Logger that writes its output to files"""
+    """Logger that writes its output to files, in batches on a writer thread"""
 
-    def __init__ (self, bot, file: str):
-        self.bot  = bot
-        self.file = file
+    # What log() does when the queue is full: wait for room, drop the oldest
+    # queued record or drop the new one. Dropped records are reported in the file
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop')
+
+    # Text lines, or JSON objects with timestamp, category, guild and message keys
+    FORMATS = ('text', 'jsonl')
+
+    def __init__ (self, bot, file: str, flush_interval: float = 1.0, max_queue: int = 10000, overflow: str = 'block',
+                  format: str = 'text', max_bytes: int = 0, rotate_daily: bool = False, level: int = 0,
+                  index: LogIndex = None):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise Exception(f'Unknown overflow policy "{overflow}", expected one of {", ".join(self.OVERFLOW_POLICIES)}')
+        if format not in self.FORMATS:
+            raise Exception(f'Unknown log format "{format}", expected one of {", ".join(self.FORMATS)}')
+
+        self.bot            = bot
+        self.file           = file
+        self.flush_interval = flush_interval
+        self.overflow       = overflow
+        self.format         = format
+        self.max_bytes      = max_bytes
+        self.rotate_daily   = rotate_daily
+        self.level          = level
+        self.index          = index
+        self.dropped        = 0
+
+        self._time_format = '%Y-%m-%dT%H:%M:%SZ' if format == 'jsonl' else '%Y-%m-%d %H:%M:%S'
+
+        # log() only queues records, _drain() hands them to the writer thread in batches
+        self._reported = 0
+        self._queue    = asyncio.Queue(maxsize = max_queue)
+        self._wake     = asyncio.Event()
+        self._task     = None
+
+        # Only used by the writer thread
+        self._handle     = None
+        self._size       = 0
+        self._day        = None
+        self._second     = None
+        self._timestamp  = None
+
+        self._executor   = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'file-logger')
+        self._compressor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'file-logger-gzip')
 
     def set_file (self, file: str) -> None:
+        # The writer thread reopens its handle before the next batch
         self.file = file
 
-    async def log (self, category: _LoggerCategory, message: str) -> None:
-        # Log to file
-        with open(self.file, 'a', encoding = 'utf-8') as file:
-            print(self.pretty(category, message), file = file)
+    async def log (self, category: _LoggerCategory, message, *args, guild: Guild = None) -> None:
+        if category.level < self.level:
+            return
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+
+        record = (time.time(), category.name, None if guild is None else guild.id, self.render(message, args))
+
+        if self._queue.full():
+            if self.overflow == 'drop':
+                self.dropped += 1
+                return
+            if self.overflow == 'drop_oldest':
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+            else:
+                # The drainer writes at once instead of waiting out the flush interval
+                self._wake.set()
+
+        await self._queue.put(record)
+
+    async def _drain (self) -> None:
+        loop = asyncio.get_event_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+
+            # Collect records for a while unless a flush has been requested
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            taken = len(batch)
+
+            if self.dropped != self._reported:
+                batch.append((time.time(), ERROR.name, None, f'{self.dropped - self._reported} log record(s) dropped, log queue was full'))
+                self._reported = self.dropped
+
+            try:
+                await loop.run_in_executor(self._executor, self._write, self.file, batch)
+            except Exception as exception:
+                print(f'[Could not write to {self.file}: {exception!r}]', *batch, sep = '\n')
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    def _format_time (self, timestamp: float) -> str:
+        # Consecutive records mostly share the same second
+        second = int(timestamp)
+        if second != self._second:
+            self._second    = second
+            self._timestamp = datetime.datetime.utcfromtimestamp(second).strftime(self._time_format)
+        return self._timestamp
+
+    def _format (self, record: tuple) -> str:
+        timestamp, category, guild_id, message = record
+
+        if self.format == 'jsonl':
+            return json.dumps({'timestamp': self._format_time(timestamp),
+                               'category' : category,
+                               'guild'    : guild_id,
+                               'message'  : message}) + '\n'
+
+        # Records are followed by an empty line as print() used to do
+        return f'[{category} - {self._format_time(timestamp)}]: {message}\n\n'
+
+    def _open (self, file: str) -> None:
+        self._handle = open(file, 'a', encoding = 'utf-8', buffering = 1 << 16)
+        self._size   = self._handle.tell()
+
+        # An existing file belongs to the day it was last written
+        modified  = os.path.getmtime(file) if self._size > 0 else time.time()
+        self._day = datetime.datetime.utcfromtimestamp(modified).date()
+
+    def _rotate (self, file: str) -> None:
+        self._handle.close()
+        self._handle = None
+
+        stem, extension = os.path.splitext(file)
+        stamp   = datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        rotated = f'{stem}-{stamp}{extension}'
+
+        # Several rotations within a second are numbered
+        index = 1
+        while os.path.exists(rotated) or os.path.exists(f'{rotated}.gz'):
+            rotated = f'{stem}-{stamp}.{index}{extension}'
+            index  += 1
+
+        os.replace(file, rotated)
+
+        self._compressor.submit(self._compress, rotated)
+
+    @staticmethod
+    def _compress (file: str) -> None:
+        with open(file, 'rb') as source, gzip.open(f'{file}.gz', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(file)
+
+    def _write (self, file: str, batch: [tuple]) -> None:
+        if self._handle is not None and self._handle.name != file:
+            self._handle.close()
+            self._handle = None
+
+        if self._handle is None:
+            self._open(file)
+
+        content = ''.join(self._format(record) for record in batch)
+        size    = len(content.encode('utf-8'))
+        day     = datetime.datetime.utcfromtimestamp(batch[0][0]).date()
+
+        # Rotated when the file would grow past max_bytes, 0 disables this, and
+        # with rotate_daily when the UTC day changes. The rotated file is
+        # renamed after the time of rotation and compressed in the background
+        if self._size > 0 and ((self.max_bytes > 0 and self._size + size > self.max_bytes) or
+                               (self.rotate_daily and day != self._day)):
+            self._rotate(file)
+            self._open(file)
+
+        self._handle.write(content)
+        self._handle.flush()
+
+        self._size += size
+        self._day   = day
+
+        # Indexed by the writer thread too, so that the log can be searched without reading the files
+        if self.index is not None:
+            # The file has been written, a failing index must not report the batch as lost
+            try:
+                self.index.add(batch)
+            except Exception as exception:
+                print(f'[Could not index {len(batch)} log record(s): {exception!r}]')
+
+    async def flush (self) -> None:
+        """Waits until every queued record has been written"""
+
+        if self._task is not None:
+            self._wake.set()
+            await self._queue.join()
+
+    async def close (self) -> None:
+        """Flushes queued records and closes the file, later log calls reopen it"""
+
+        await self.flush()
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self._handle is not None:
+            await asyncio.get_event_loop().run_in_executor(self._executor, self._handle.close)
+            self._handle = None
+
+        if self.index is not None:
+            await asyncio.get_event_loop().run_in_executor(self._executor, self.index.close)
+
+class _ChannelBuffer:
+    """Messages waiting to be sent to a single channel"""
+
+    __slots__ = ('entries', 'task', 'lock', 'limiter', 'guild_id')
+
+    def __init__ (self, limiter: RateLimiter, guild_id: int = None):
+        self.entries  = []
+        self.task     = None
+        self.lock     = asyncio.Lock()
+        self.limiter  = limiter
+        self.guild_id = guild_id
 
 class ChannelLogger (_Logger):
-    """Logger that writes its output to a Discord TextChannel"""
+    """Logger that writes its output to Discord TextChannels, buffered and paced per channel"""
+
+    # Discord allows 4096 characters in an embed description
+    DESCRIPTION_LIMIT = 4096
+
+    # Discord allows roughly 5 messages every 5 seconds per channel
+    CHANNEL_RATE = 5
+    CHANNEL_PER  = 5.0
+
+    # Sends in flight at once across all channels, Discord's global rate limit
+    # is 50 requests per second
+    SEND_CONCURRENCY = 10
 
-    def __init__ (self, bot, channel: int = None):
-        self.bot     = bot
-        self.channel = channel
+    def __init__ (self, bot, channel: int = None, window: float = 2.0, priority: (str,) = ('ERROR',), level: int = 0):
+        self.bot      = bot
+        self.channel  = channel
+        self.window   = window
+        self.priority = tuple(priority)
+        self.level    = level
+
+        # Messages are buffered per channel for `window` seconds and sent
+        # together, those of a `priority` category at once along with whatever
+        # was buffered before them. Sends are paced per channel
+        self._buffers  = {}
+        self._sends    = asyncio.Semaphore(self.SEND_CONCURRENCY)
+
+        # Channels logged to without a guild, such as the one set with
+        # set_channel, resolved once and kept until forget() is called
+        self._channels = {}
+
+        # Channels with broadcast messages waiting for the next broadcast flush
+        self._broadcast      = set()
+        self._broadcast_task = None
 
     def set_channel (self, channel: int) -> None:
+        self.forget(self.channel)
         self.channel = int(channel)
 
-    async def log (self, category: _LoggerCategory, message: str) -> None:
-        await self.bot.wait_until_ready()
+    async def log (self, category: _LoggerCategory, message, *args) -> None:
+        if category.level < self.level:
+            return
 
         if self.channel is None:
             # Log message in all log channels
-            for channel in self.bot.cache['admin.json'].values():
-                await ChannelLogger(self.bot, int(channel['log'])).log(category, message)
+            await self.broadcast(category, message, *args)
         else:
             # Log message in the channel that has been set
-            channel = utils.get(self.bot.get_all_channels(), id = self.channel)
+            await self.send_to(self.channel, category, self.render(message, args))
 
-            if channel is None:
-                print(f'[Channel has not been set] - {self.pretty(category, message)}')
-            else:
-                embed = Embed(color       = category.color,
-                              description = message,
-                              timestamp   = constants.get_current_time(),
-                              title       = category.name.upper(),
-                              type        = 'rich')
-                embed.set_author(name     = self.bot.user.name,
-                                 icon_url = self.bot.user.avatar_url)
-                await channel.send(embed = embed)
+    async def broadcast (self, category: _LoggerCategory, message, *args) -> None:
+        """
+        Buffers a message for the log channel of every guild that has not muted
+        its category and whose log level is not above it
+        """
+
+        text = None
+
+        for config in self.bot.guild_configs.values():
+            if config.log is not None and category.level >= config.level and category.name not in config.muted:
+                if text is None:
+                    text = self.render(message, args)
+
+                self._buffer(config.log, config.guild_id).entries.append((category, text))
+                self._broadcast.add(config.log)
+
+        if category.name in self.priority:
+            await self._flush_broadcast()
+        elif self._broadcast_task is None and len(self._broadcast) > 0:
+            self._broadcast_task = asyncio.ensure_future(self._broadcast_later())
+
+    async def _broadcast_later (self) -> None:
+        await asyncio.sleep(self.window)
+        self._broadcast_task = None
+        await self._flush_broadcast()
+
+    async def _flush_broadcast (self) -> None:
+        channel_ids, self._broadcast = self._broadcast, set()
+        if len(channel_ids) == 0:
+            return
+
+        start     = time.perf_counter()
+        delivered = await asyncio.gather(*[self._flush(channel_id, self._buffer(channel_id)) for channel_id in channel_ids])
+        elapsed   = time.perf_counter() - start
+
+        await self.bot.file_logger.log(DEBUG, 'Broadcast to {} log channels completed in {:.2f}s, {} failed',
+                                       len(channel_ids), elapsed, delivered.count(False))
+
+    def _buffer (self, channel_id: int, guild_id: int = None) -> _ChannelBuffer:
+        buffer = self._buffers.get(channel_id)
+        if buffer is None:
+            buffer = self._buffers[channel_id] = _ChannelBuffer(RateLimiter(self.CHANNEL_RATE, self.CHANNEL_PER), guild_id)
+        elif buffer.guild_id is None:
+            buffer.guild_id = guild_id
+        return buffer
+
+    def _resolve (self, channel_id: int, guild_id: int = None):
+        """Returns the channel with the ID, None if it does not exist"""
+
+        # A dict lookup in the guild instead of a scan of every channel the bot can see
+        if guild_id is not None:
+            guild = self.bot.get_guild(guild_id)
+            return None if guild is None else guild.get_channel(channel_id)
+
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            # Client.get_channel looks through every guild, the result is kept
+            channel = self.bot.get_channel(channel_id)
+            if channel is not None:
+                self._channels[channel_id] = channel
+
+        return channel
+
+    def forget (self, channel_id: int) -> None:
+        """Drops the kept reference to a channel, called when the channel is deleted"""
+        self._channels.pop(channel_id, None)
+
+    async def send_to (self, channel_id: int, category: _LoggerCategory, message: str, guild_id: int = None) -> None:
+        """Buffers a message for a channel, priority messages are sent before returning
+
+        Passing the guild of the channel lets it be looked up without a search
+        """
+
+        buffer = self._buffer(channel_id, guild_id)
+        buffer.entries.append((category, message))
+
+        if category.name in self.priority:
+            await self._flush(channel_id, buffer)
+        elif buffer.task is None:
+            buffer.task = asyncio.ensure_future(self._flush_later(channel_id, buffer))
+
+    async def _flush_later (self, channel_id: int, buffer: _ChannelBuffer) -> None:
+        await asyncio.sleep(self.window)
+        buffer.task = None
+        await self._flush(channel_id, buffer)
+
+    def _embeds (self, entries: [tuple]) -> [Embed]:
+        """Combines consecutive messages of a category into as few embeds as the description limit allows"""
+
+        groups = []
+
+        for category, message in entries:
+            # Messages that do not fit into an embed on their own are split
+            chunks = [message[start:start + self.DESCRIPTION_LIMIT] for start in range(0, len(message), self.DESCRIPTION_LIMIT)] or ['']
+
+            for chunk in chunks:
+                if len(groups) > 0 and groups[-1][0].name == category.name and \
+                   len(groups[-1][1]) + 1 + len(chunk) <= self.DESCRIPTION_LIMIT:
+                    groups[-1][1] = f'{groups[-1][1]}\n{chunk}'
+                else:
+                    groups.append([category, chunk])
+
+        embeds = []
+
+        for category, description in groups:
+            embed = Embed(color       = category.color,
+                          description = description,
+                          timestamp   = constants.get_current_time(),
+                          title       = category.name.upper(),
+                          type        = 'rich')
+            embed.set_author(name     = self.bot.user.name,
+                             icon_url = self.bot.user.avatar_url)
+            embeds.append(embed)
+
+        return embeds
+
+    async def _flush (self, channel_id: int, buffer: _ChannelBuffer, attachment: str = None) -> bool:
+        """
+        Sends the buffered messages of a channel, returns False if they could
+        not be delivered. The file at `attachment` is sent with the last embed
+        """
+
+        await self.bot.wait_until_ready()
+
+        delivered = True
+
+        # The lock keeps messages in order when a priority flush overlaps a scheduled one
+        async with buffer.lock:
+            entries, buffer.entries = buffer.entries, []
+
+            if len(entries) > 0:
+                channel = self._resolve(channel_id, buffer.guild_id)
+
+                if channel is None:
+                    delivered = False
+                    for category, message in entries:
+                        print(f'[Channel has not been set] - {self.pretty(category, message)}')
+                else:
+                    try:
+                        embeds = self._embeds(entries)
+                        for index, embed in enumerate(embeds, start = 1):
+                            file = File(attachment) if attachment is not None and index == len(embeds) else None
+                            async with buffer.limiter, self._sends:
+                                await channel.send(embed = embed, file = file)
+                    except HTTPException as e:
+                        # A guild removing the bot's permissions must not stop other channels
+                        delivered = False
+                        print(f'[Could not send to {channel_id}: {e}] - {len(entries)} message(s) dropped')
+
+            if len(buffer.entries) == 0 and buffer.task is None and buffer.limiter.idle:
+                self._buffers.pop(channel_id, None)
+
+        return delivered
+
+    async def send_file (self, channel_id: int, category: _LoggerCategory, message: str, path: str, guild_id: int = None) -> bool:
+        """
+        Sends a message with a file attached right away, after whatever was
+        buffered for the channel. Returns False if it could not be delivered
+        """
+
+        buffer = self._buffer(channel_id, guild_id)
+        buffer.entries.append((category, message))
+
+        return await self._flush(channel_id, buffer, path)
+
+    async def flush (self) -> None:
+        """Sends every buffered message"""
+
+        if self._broadcast_task is not None:
+            self._broadcast_task.cancel()
+            self._broadcast_task = None
+        await self._flush_broadcast()
+
+        for buffer in self._buffers.values():
+            if buffer.task is not None:
+                buffer.task.cancel()
+                buffer.task = None
+        await asyncio.gather(*[self._flush(channel_id, buffer) for channel_id, buffer in list(self._buffers.items())])
 
 class CommonLogger:
+    """
+    Logs to both the file and the log channels
+
+    Messages may be lazily formatted (see _Logger.render), they are built once
+    and only if the file or a log channel takes their category
+    """
+
     def __init__ (self, file_logger: FileLogger, channel_logger: ChannelLogger):
         self.file_logger    = file_logger
         self.channel_logger = channel_logger
 
-    async def log (self, category: _LoggerCategory, message: str) -> None:
+    def set_level (self, level: int) -> None:
+        """Sets the global minimum level of the file and the log channels"""
+        self.file_logger.level    = level
+        self.channel_logger.level = level
+
+    async def log (self, category: _LoggerCategory, message, *args) -> None:
+        if not self.file_logger.accepts(category) and not self.channel_logger.accepts(category):
+            return
+
+        message = _Logger.render(message, args)
+
         await self.file_logger.log(category, message)
         await self.channel_logger.log(category, message)
 
-    async def guild_specific_log(self, guild: Guild, category: _LoggerCategory, message: str):
-        channel_id = int(self.channel_logger.bot.cache['admin.json'][str(guild.id)]['log'])
-        await ChannelLogger(self.channel_logger.bot, channel_id).log(category, message)
+    async def guild_specific_log(self, guild: Guild, category: _LoggerCategory, message, *args):
+        # DMs and guilds that have not been provisioned yet have no log channel
+        config  = None if guild is None else self.channel_logger.bot.guild_configs.get(guild.id)
+        channel = config is not None and self.channel_logger.accepts(category) and category.level >= config.level
+
+        if not self.file_logger.accepts(category) and not channel:
+            return
+
+        message = _Logger.render(message, args)
+
+        await self.file_logger.log(category, message, guild = guild)
+        if channel:
+            await self.channel_logger.send_to(config.log, category, message, guild.id)
+
+    async def guild_specific_file (self, guild: Guild, category: _LoggerCategory, message: str, path: str) -> bool:
+        """
+        Logs a message and sends it with the file at `path` attached to the log
+        channel of a guild. Returns whether the file was delivered
+        """
+
+        await self.file_logger.log(category, message, guild = guild)
+
+        config = None if guild is None else self.channel_logger.bot.guild_configs.get(guild.id)
+        if config is None or not self.channel_logger.accepts(category) or category.level < config.level:
+            return False
+
+        return await self.channel_logger.send_file(config.log, category, message, path, guild.id)
 
 DEBUG = Debug()
 ERROR = Error()
 INFO  = Info()
+
+# Categories by name, for commands that take a category
+CATEGORIES = {category.name: category for category in (DEBUG, ERROR, INFO)}
@@ -0,0 +1,152 @@
+"""
+logindex.py
+"""
+
+import datetime
+import re
+import sqlite3
+import threading
+
+class LogIndex:
+    """
+    Full text index of log records in an SQLite database
+
+    Records are kept in one FTS5 table per UTC day, named day_YYYYmmdd, with
+    the message as the indexed column and the timestamp, category and guild ID
+    stored next to it. Searches start at the newest day and skip the days
+    before `since`, so narrowing a search by time also narrows the tables it
+    reads. Days older than `retention` days are dropped (0 keeps every day)
+
+    add() is called by the FileLogger writer thread, searches run on executor
+    threads through a separate connection
+    """
+
+    _TABLE = re.compile(r'^day_(\d{8})$')
+
+    def __init__ (self, path: str, retention: int = 0):
+        self.path      = path
+        self.retention = retention
+
+        self._tables = set()
+        self._newest = None
+
+        self._writer = None
+        self._reader = None
+        self._lock   = threading.Lock()
+
+    def _connect (self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, isolation_level = None, check_same_thread = False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    def _days (self, connection: sqlite3.Connection) -> [str]:
+        """Returns the days that have a table, newest first"""
+
+        rows  = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'day\\_%' ESCAPE '\\'")
+        names = (self._TABLE.match(name) for name, in rows)
+        return sorted((match.group(1) for match in names if match is not None), reverse = True)
+
+    def _table (self, day: str) -> str:
+        table = f'day_{day}'
+
+        if table not in self._tables:
+            self._writer.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5('
+                                 f'message, timestamp UNINDEXED, category UNINDEXED, guild UNINDEXED)')
+            self._tables.add(table)
+
+            if self._newest is None or day > self._newest:
+                self._newest = day
+                self._prune(day)
+
+        return table
+
+    def _prune (self, newest: str) -> None:
+        if self.retention <= 0:
+            return
+
+        oldest = (datetime.datetime.strptime(newest, '%Y%m%d') - datetime.timedelta(days = self.retention - 1)).strftime('%Y%m%d')
+
+        for day in self._days(self._writer):
+            if day < oldest:
+                self._writer.execute(f'DROP TABLE IF EXISTS day_{day}')
+                self._tables.discard(f'day_{day}')
+
+    def add (self, records: [tuple]) -> None:
+        """Indexes (timestamp, category, guild ID, message) records"""
+
+        if self._writer is None:
+            self._writer = self._connect()
+
+        days = {}
+        for record in records:
+            day = datetime.datetime.utcfromtimestamp(record[0]).strftime('%Y%m%d')
+            days.setdefault(day, []).append((record[3], record[0], record[1], record[2]))
+
+        with self._writer:
+            self._writer.execute('BEGIN')
+            for day, rows in days.items():
+                self._writer.executemany(f'INSERT INTO {self._table(day)} (message, timestamp, category, guild) VALUES (?, ?, ?, ?)', rows)
+
+    def search (self, query: str, guild_id: int = None, since: float = None, offset: int = 0, limit: int = 10) -> ([tuple], bool):
+        """
+        Returns up to `limit` (timestamp, category, guild ID, message) records
+        matching an FTS5 query, newest first, after skipping `offset` of them,
+        and whether more records match
+        """
+
+        conditions = ['message MATCH ?']
+        parameters = [query]
+
+        if guild_id is not None:
+            conditions.append('guild = ?')
+            parameters.append(guild_id)
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            parameters.append(since)
+
+        where  = ' AND '.join(conditions)
+        oldest = None if since is None else datetime.datetime.utcfromtimestamp(since).strftime('%Y%m%d')
+        wanted = limit + 1
+        found  = []
+
+        with self._lock:
+            if self._reader is None:
+                self._reader = self._connect()
+
+            for day in self._days(self._reader):
+                if oldest is not None and day < oldest:
+                    break
+
+                table = f'day_{day}'
+
+                # Whole days inside the offset are counted, not read
+                if offset > 0:
+                    count, = self._reader.execute(f'SELECT count(*) FROM {table} WHERE {where}', parameters).fetchone()
+                    if count <= offset:
+                        offset -= count
+                        continue
+
+                rows = self._reader.execute(f'SELECT timestamp, category, guild, message FROM {table} WHERE {where} '
+                                            f'ORDER BY rowid DESC LIMIT ? OFFSET ?', (*parameters, wanted - len(found), offset))
+                found.extend(rows)
+                offset = 0
+
+                if len(found) >= wanted:
+                    break
+
+        return found[:limit], len(found) > limit
+
+    def close (self) -> None:
+        """Closes the connections, they are reopened when needed"""
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._tables.clear()
+            self._newest = None
+
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
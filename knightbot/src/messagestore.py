@@ -0,0 +1,131 @@
+"""
+messagestore.py
+"""
+
+import sys
+import zlib
+
+from collections import (
+    OrderedDict
+)
+from discord import (
+    Message
+)
+from discord.utils import (
+    snowflake_time
+)
+
+class StoredMessage:
+    """Compact copy of a message, the content is kept as UTF-8 bytes and compressed when long"""
+
+    __slots__ = (
+        'id',
+        'author_id',
+        'author',
+        'attachments',
+        'size',
+        '_content',
+        '_compressed'
+    )
+
+    def __init__ (self, message: Message, compress_above: int = None):
+        content = message.content.encode('utf-8')
+
+        self.id          = message.id
+        self.author_id   = message.author.id
+        self.attachments = tuple(attachment.url for attachment in message.attachments) or None
+
+        # Interned, the records of an author share one string
+        self.author = sys.intern(f'{message.author.name}#{message.author.discriminator}')
+
+        self._compressed = compress_above is not None and len(content) > compress_above
+        self._content    = zlib.compress(content, 1) if self._compressed else content
+
+        self.size = MessageStore.RECORD_OVERHEAD + sys.getsizeof(self._content)
+        if self.attachments is not None:
+            self.size += sys.getsizeof(self.attachments) + sum(sys.getsizeof(url) for url in self.attachments)
+
+    @property
+    def created_at (self):
+        return snowflake_time(self.id)
+
+    @property
+    def content (self) -> str:
+        return (zlib.decompress(self._content) if self._compressed else self._content).decode('utf-8')
+
+class MessageStore:
+    """
+    Keeps the latest messages of every channel so that deleted messages can be
+    recovered after they left discord.py's own message cache
+
+    Every channel holds at most `per_channel` messages, the oldest is dropped
+    first. All channels together stay within `max_bytes`: when a message does
+    not fit, messages are dropped from the channels that have been quiet the
+    longest. Content longer than `compress_above` bytes is stored compressed
+    with zlib (None stores every content as is)
+    """
+
+    # Bytes of a record besides its content and attachments: the object with
+    # its slots, the ID ints and its share of the channel's OrderedDict
+    RECORD_OVERHEAD = 8 * len(StoredMessage.__slots__) + 16 + 2 * 32 + 120
+
+    def __init__ (self, max_bytes: int, per_channel: int = 500, compress_above: int = 128):
+        self.max_bytes      = max_bytes
+        self.per_channel    = per_channel
+        self.compress_above = compress_above
+
+        self.size = 0
+
+        # Channel ID to its messages, both ordered from least to most recently added
+        self._channels = OrderedDict()
+
+    def __len__ (self) -> int:
+        return sum(len(messages) for messages in self._channels.values())
+
+    def add (self, message: Message) -> None:
+        record   = StoredMessage(message, self.compress_above)
+        messages = self._channels.get(message.channel.id)
+
+        if messages is None:
+            messages = self._channels[message.channel.id] = OrderedDict()
+        else:
+            self._channels.move_to_end(message.channel.id)
+
+        messages[record.id] = record
+        self.size += record.size
+
+        if len(messages) > self.per_channel:
+            _, dropped = messages.popitem(last = False)
+            self.size -= dropped.size
+
+        while self.size > self.max_bytes and len(self._channels) > 0:
+            self._evict()
+
+    def _evict (self) -> None:
+        channel_id, messages = next(iter(self._channels.items()))
+
+        _, dropped = messages.popitem(last = False)
+        self.size -= dropped.size
+
+        if len(messages) == 0:
+            del self._channels[channel_id]
+
+    def pop (self, channel_id: int, message_id: int) -> StoredMessage:
+        """Removes and returns a stored message, None if it is not stored"""
+
+        messages = self._channels.get(channel_id)
+        if messages is None:
+            return None
+
+        record = messages.pop(message_id, None)
+        if record is not None:
+            self.size -= record.size
+            if len(messages) == 0:
+                del self._channels[channel_id]
+
+        return record
+
+    def remove_channel (self, channel_id: int) -> None:
+        messages = self._channels.pop(channel_id, None)
+        if messages is not None:
+            self.size -= sum(record.size for record in messages.values())
@@ -0,0 +1,77 @@
+"""
+persistence.py
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+def atomic_write_text (path: str, content: str) -> None:
+    """
+    Writes content to a temporary file next to path and renames it over path
+
+    Readers see either the old or the new file, never a partially written one
+    """
+
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir = directory, prefix = '.', suffix = '.tmp')
+
+    try:
+        with os.fdopen(fd, 'w', encoding = 'utf-8') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def atomic_write_json (path: str, data, indent: int = 4) -> None:
+    """Serialises data and writes it with atomic_write_text, meant to be run in an executor"""
+
+    atomic_write_text(path, json.dumps(data, indent = indent))
+
+class DebouncedWriter:
+    """
+    Coalesces many save requests into a single call of an async flush function
+
+    The first call to schedule() starts a timer of `delay` seconds; every call
+    made before the timer runs out is folded into the same flush. Flushes never
+    overlap, a schedule() during a flush queues exactly one more
+    """
+
+    def __init__ (self, flush, delay: float):
+        self._flush = flush
+        self.delay  = delay
+
+        self._task = None
+
+        # Held while flushing, others may hold it to keep flushes out
+        self.lock = asyncio.Lock()
+
+    @property
+    def pending (self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def schedule (self) -> None:
+        if not self.pending:
+            self._task = asyncio.ensure_future(self._delayed_flush())
+
+    async def _delayed_flush (self) -> None:
+        await asyncio.sleep(self.delay)
+        # Changes made from here on schedule a new flush
+        self._task = None
+        async with self.lock:
+            await self._flush()
+
+    async def flush (self) -> None:
+        """Flushes immediately, cancelling a scheduled flush"""
+
+        if self.pending:
+            self._task.cancel()
+            self._task = None
+
+        async with self.lock:
+            await self._flush()
@@ -0,0 +1,86 @@
+"""
+prefix.py
+"""
+
+class PrefixResolver:
+    """
+    Resolves the command prefixes for a message
+
+    Prefix tuples are built once when the bot becomes ready and shared between
+    messages, so resolving prefixes is a single dict lookup per message. Guilds
+    without a custom prefix share the default tuple
+    """
+
+    def __init__ (self, default_prefix, custom_prefix: dict = None):
+        self._default  = self._normalise(default_prefix)
+        self._custom   = {}
+        self._mentions = ()
+        self._dm       = self._default
+        self._table    = {}
+
+        # Keys in prefix.json are strings while guild IDs are ints
+        for guild_id, prefix in (custom_prefix or {}).items():
+            self._custom[int(guild_id)] = self._normalise(prefix)
+
+    @staticmethod
+    def _normalise (prefix) -> tuple:
+        if isinstance(prefix, str):
+            return (prefix,)
+        return tuple(prefix)
+
+    @property
+    def default_prefix (self) -> tuple:
+        return self._default
+
+    @property
+    def custom_prefix (self) -> dict:
+        return dict(self._custom)
+
+    def build (self, user_id: int) -> None:
+        """Precomputes the prefix tuples, must be called once the bot user is known"""
+
+        self._mentions = (f'<@!{user_id}>', f'<@{user_id}>')
+        self._dm       = self._mentions + self._default
+        self._table    = {guild_id: self._mentions + prefix for guild_id, prefix in self._custom.items()}
+
+    def invalidate (self, guild_id: int) -> None:
+        """Rebuilds the prefix tuple of a single guild after its custom prefix has changed"""
+
+        prefix = self._custom.get(guild_id)
+
+        if prefix is None:
+            self._table.pop(guild_id, None)
+        else:
+            self._table[guild_id] = self._mentions + prefix
+
+    def set_prefix (self, guild_id: int, prefix) -> None:
+        self._custom[guild_id] = self._normalise(prefix)
+        self.invalidate(guild_id)
+
+    def reset_prefix (self, guild_id: int) -> bool:
+        """Removes the custom prefix of a guild, returns False if it had none"""
+
+        if self._custom.pop(guild_id, None) is None:
+            return False
+
+        self.invalidate(guild_id)
+        return True
+
+    def to_json (self) -> dict:
+        """Returns the contents of prefix.json"""
+
+        return {
+            'default_prefix': self._default[0] if len(self._default) == 1 else list(self._default),
+            'custom_prefix': {
+                str(guild_id): prefix[0] if len(prefix) == 1 else list(prefix)
+                for guild_id, prefix in self._custom.items()
+            }
+        }
+
+    def resolve (self, guild_id: int = None) -> tuple:
+        """Returns the prefixes for a guild, or for DMs if guild_id is None"""
+
+        # Only allows custom prefixes in guilds
+        if guild_id is None:
+            return self._dm
+        return self._table.get(guild_id, self._dm)
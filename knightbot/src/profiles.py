@@ -0,0 +1,41 @@
+"""
+profiles.py
+"""
+
+from discord import (
+    Intents,
+    MemberCacheFlags
+)
+
+def _full () -> dict:
+    return {
+        'intents'                : Intents.all(),
+        'member_cache_flags'     : MemberCacheFlags.all(),
+        'chunk_guilds_at_startup': True
+    }
+
+def _low () -> dict:
+    # Member joins, removals and bans are still received, but members are not
+    # cached or chunked. Features that need a member fetch it from Discord
+    intents = Intents.default()
+    intents.members = True
+
+    return {
+        'intents'                : intents,
+        'member_cache_flags'     : MemberCacheFlags.none(),
+        'chunk_guilds_at_startup': False
+    }
+
+# Memory profiles that can be set as 'memory_profile' in env.json
+MEMORY_PROFILES = {
+    'full': _full,
+    'low' : _low
+}
+
+def client_options (profile: str) -> dict:
+    """Returns the Client options (intents, member cache flags and chunking) of a memory profile"""
+
+    if profile not in MEMORY_PROFILES:
+        raise Exception(f'Unknown memory profile "{profile}", expected one of {", ".join(MEMORY_PROFILES)}')
+
+    return MEMORY_PROFILES[profile]()
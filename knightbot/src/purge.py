@@ -0,0 +1,225 @@
+"""
+purge.py
+"""
+
+import asyncio
+import datetime
+import re
+
+from collections import (
+    OrderedDict
+)
+from discord import (
+    HTTPException,
+    Message,
+    NotFound,
+    Object,
+    TextChannel
+)
+from ratelimit import (
+    RateLimiter
+)
+
+class RecentIds:
+    """
+    Set of the latest `size` IDs added, the oldest is dropped first
+
+    Knight keeps the IDs of messages it deletes itself here, so the delete
+    events Discord sends back for them can be told apart
+    """
+
+    def __init__ (self, size: int):
+        self.size = size
+        self._ids = OrderedDict()
+
+    def __contains__ (self, item: int) -> bool:
+        return item in self._ids
+
+    def __len__ (self) -> int:
+        return len(self._ids)
+
+    def add (self, item: int) -> None:
+        self._ids[item] = None
+        self._ids.move_to_end(item)
+
+        if len(self._ids) > self.size:
+            self._ids.popitem(last = False)
+
+    def discard (self, item: int) -> bool:
+        """Removes an ID, returns whether it was present"""
+        if item in self._ids:
+            del self._ids[item]
+            return True
+        return False
+
+class PurgeFilter:
+    """Selects the messages a purge deletes, every condition that is set has to match"""
+
+    __slots__ = (
+        'authors',
+        'bots',
+        'pattern',
+        'attachments'
+    )
+
+    def __init__ (self, authors: (int,) = (), bots: bool = False, pattern: str = None, attachments: bool = False):
+        self.authors     = frozenset(authors)
+        self.bots        = bots
+        self.pattern     = None if pattern is None else re.compile(pattern)
+        self.attachments = attachments
+
+    def matches (self, message: Message) -> bool:
+        if len(self.authors) > 0 and message.author.id not in self.authors:
+            return False
+        if self.bots and not message.author.bot:
+            return False
+        if self.attachments and len(message.attachments) == 0:
+            return False
+        if self.pattern is not None and self.pattern.search(message.content) is None:
+            return False
+        return True
+
+class PurgeJob:
+    """
+    Deletes the messages of a channel that match a PurgeFilter
+
+    The channel history is read as a stream and up to `limit` messages are
+    looked at, newest first, or oldest first when `after` is given, as
+    TextChannel.history does. Messages younger than 14 days are deleted in bulk
+    delete calls of up to 100 messages. Older messages cannot be bulk deleted,
+    they are passed to a second lane that deletes them one at a time, paced to
+    the per channel rate limit, while the history is still being read.
+    on_message is called with every message right before it is deleted, and
+    its ID is added to `deleted_ids`
+
+    The counters can be read while the job runs to report progress. cancel()
+    stops the job after the current delete call
+    """
+
+    # Discord bulk deletes up to 100 messages younger than 14 days
+    BULK_LIMIT = 100
+    BULK_AGE   = datetime.timedelta(days = 14)
+
+    # Single deletes are limited to roughly 5 every 5 seconds per channel
+    SINGLE_RATE = 5
+    SINGLE_PER  = 5.0
+
+    def __init__ (self, channel: TextChannel, limit: int, filter: PurgeFilter = None, before: int = None, after: int = None,
+                  on_message = None, deleted_ids: RecentIds = None):
+        self.channel     = channel
+        self.limit       = limit
+        self.filter      = filter or PurgeFilter()
+        self.before      = None if before is None else Object(before)
+        self.after       = None if after is None else Object(after)
+        self.on_message  = on_message
+        self.deleted_ids = deleted_ids
+
+        self.scanned   = 0
+        self.deleted   = 0
+        self.failed    = 0
+        self.cancelled = False
+
+        self._limiter = RateLimiter(self.SINGLE_RATE, self.SINGLE_PER)
+
+        # Bounded, so a long run of old messages holds back the history reader
+        self._old = asyncio.Queue(maxsize = self.BULK_LIMIT)
+
+    def cancel (self) -> None:
+        self.cancelled = True
+
+    def _deleting (self, message: Message) -> None:
+        if self.on_message is not None:
+            self.on_message(message)
+        if self.deleted_ids is not None:
+            self.deleted_ids.add(message.id)
+
+    async def _bulk (self, messages: [Message]) -> None:
+        for message in messages:
+            self._deleting(message)
+
+        try:
+            await self.channel.delete_messages(messages)
+            self.deleted += len(messages)
+        except HTTPException:
+            self.failed += len(messages)
+
+    async def _single_lane (self) -> None:
+        while True:
+            message = await self._old.get()
+            if message is None or self.cancelled:
+                return
+
+            self._deleting(message)
+
+            async with self._limiter:
+                try:
+                    await message.delete()
+                    self.deleted += 1
+                except NotFound:
+                    # Deleted by someone else in the meantime
+                    pass
+                except HTTPException:
+                    self.failed += 1
+
+    async def _hand_over (self, message: Message, single: asyncio.Future) -> bool:
+        """Queues a message for the single lane, returns False if the lane stopped first"""
+
+        if single.done():
+            return False
+
+        if not self._old.full():
+            self._old.put_nowait(message)
+            return True
+
+        # The lane may stop, cancelled or failed, with the queue still full
+        put = asyncio.ensure_future(self._old.put(message))
+        try:
+            await asyncio.wait((put, single), return_when = asyncio.FIRST_COMPLETED)
+        finally:
+            queued = put.done()
+            if not queued:
+                put.cancel()
+
+        return queued
+
+    async def run (self) -> 'PurgeJob':
+        """Runs the job, an error of either lane is raised once both have stopped"""
+
+        single   = asyncio.ensure_future(self._single_lane())
+        batch    = []
+        finished = False
+
+        # A minute of margin for messages that age while the job runs
+        cutoff = datetime.datetime.utcnow() - self.BULK_AGE + datetime.timedelta(minutes = 1)
+
+        try:
+            async for message in self.channel.history(limit = self.limit, before = self.before, after = self.after):
+                if self.cancelled:
+                    break
+
+                self.scanned += 1
+                if not self.filter.matches(message):
+                    continue
+
+                if message.created_at > cutoff:
+                    batch.append(message)
+                    if len(batch) == self.BULK_LIMIT:
+                        await self._bulk(batch)
+                        batch = []
+                elif not await self._hand_over(message, single):
+                    break
+
+            if len(batch) > 0 and not self.cancelled and not single.done():
+                await self._bulk(batch)
+            finished = True
+        finally:
+            # The lane drains the queue unless the job was cancelled or reading failed
+            if not finished or self.cancelled or not await self._hand_over(None, single):
+                single.cancel()
+
+            try:
+                await single
+            except asyncio.CancelledError:
+                pass
+
+        return self
@@ -0,0 +1,55 @@
+"""
+ratelimit.py
+"""
+
+import asyncio
+import time
+
+class RateLimiter:
+    """
+    Token bucket that allows `rate` requests every `per` seconds
+
+    discord.py retries requests that hit a 429, this keeps Knight from getting
+    there in the first place when it fires many requests at the same route
+
+        async with limiter:
+            await channel.send(...)
+    """
+
+    def __init__ (self, rate: int, per: float):
+        self.rate = rate
+        self.per  = per
+
+        self._tokens  = float(rate)
+        self._updated = time.monotonic()
+        self._lock    = asyncio.Lock()
+
+    def _refill (self) -> None:
+        now = time.monotonic()
+        self._tokens  = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    @property
+    def idle (self) -> bool:
+        """Returns True if the bucket is full i.e. the limiter can be discarded"""
+
+        self._refill()
+        return self._tokens >= self.rate
+
+    async def acquire (self) -> None:
+        async with self._lock:
+            while True:
+                self._refill()
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+    async def __aenter__ (self) -> 'RateLimiter':
+        await self.acquire()
+        return self
+
+    async def __aexit__ (self, exc_type, exc_val, exc_tb) -> None:
+        pass
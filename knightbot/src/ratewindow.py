@@ -0,0 +1,110 @@
+"""
+ratewindow.py
+"""
+
+import time
+
+from array import (
+    array
+)
+from collections import (
+    OrderedDict
+)
+
+class _Ring:
+    """Timestamps of the latest events of a key, oldest overwritten first"""
+
+    __slots__ = (
+        'times',
+        'values',
+        'head'
+    )
+
+    def __init__ (self, size: int, values: bool):
+        self.times  = array('d', bytes(8 * size))
+        self.values = [None] * size if values else None
+        self.head   = 0
+
+class SlidingWindow:
+    """
+    Detects keys with `limit` events within `per` seconds
+
+    Every key keeps a ring buffer of the times of its last `limit` events, a
+    key is over the limit when the oldest of them is less than `per` seconds
+    old. Keys are kept ordered by their last event: keys that have had no
+    event for `per` seconds can no longer be over the limit and are dropped as
+    new events come in, and at most `max_keys` keys are kept, the longest idle
+    is dropped first. Memory depends on the number of keys active in the last
+    `per` seconds, not on the number of keys ever seen
+
+    With `values` set, a value can be kept with every event, recent() returns
+    those of the events within the window
+    """
+
+    def __init__ (self, limit: int, per: float, max_keys: int = 100000, values: bool = False):
+        self.limit    = limit
+        self.per      = per
+        self.max_keys = max_keys
+        self.values   = values
+
+        self._keys = OrderedDict()
+
+    def __len__ (self) -> int:
+        return len(self._keys)
+
+    def __contains__ (self, key) -> bool:
+        return key in self._keys
+
+    def hit (self, key, count: int = 1, now: float = None, value = None) -> bool:
+        """Records `count` events of a key, returns whether the key is over the limit"""
+
+        now  = time.monotonic() if now is None else now
+        ring = self._keys.get(key)
+
+        if ring is None:
+            ring = self._keys[key] = _Ring(self.limit, self.values)
+            self._evict(now)
+        else:
+            self._keys.move_to_end(key)
+
+        times = ring.times
+        for _ in range(min(count, self.limit)):
+            times[ring.head] = now
+            if ring.values is not None:
+                ring.values[ring.head] = value
+            ring.head = (ring.head + 1) % self.limit
+
+        # The slot at the head holds the oldest of the last `limit` events, 0 if there were fewer
+        oldest = times[ring.head]
+        return oldest > 0 and now - oldest < self.per
+
+    def recent (self, key, now: float = None) -> list:
+        """Returns the values of the events of a key within the window, oldest first"""
+
+        now  = time.monotonic() if now is None else now
+        ring = self._keys.get(key)
+
+        if ring is None or ring.values is None:
+            return []
+
+        order = [(ring.head + offset) % self.limit for offset in range(self.limit)]
+        return [ring.values[index] for index in order if ring.times[index] > 0 and now - ring.times[index] < self.per]
+
+    def reset (self, key) -> None:
+        """Forgets the events of a key, e.g. once it has been acted on"""
+        self._keys.pop(key, None)
+
+    def _evict (self, now: float) -> None:
+        keys = self._keys
+
+        while len(keys) > self.max_keys:
+            keys.popitem(last = False)
+
+        # The first key is the longest idle, the key just added is last
+        while len(keys) > 1:
+            ring = next(iter(keys.values()))
+
+            # The slot before the head holds the latest event
+            if now - ring.times[ring.head - 1] < self.per:
+                break
+            keys.popitem(last = False)
@@ -32,10 +32,13 @@ def setup () -> None:
             os.mkdir(location)
 
     data = {
-        'token'          : None,
-        'name'           : 'Knight',
-        'owner'          : None,
-        'support'        : __support__
+        'token'             : None,
+        'name'              : 'Knight',
+        'owner'             : None,
+        'support'           : __support__,
+        'cache_backend'     : 'json',
+        'snapshot_retention': 7,
+        'memory_profile'    : 'full'
     }
 
     env_directory = '../resources/env'
@@ -0,0 +1,171 @@
+"""
+snapshot.py
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import zlib
+
+from persistence import (
+    atomic_write_json
+)
+
+class SnapshotStore:
+    """
+    Versioned, content-addressed backups of a directory
+
+    Every file is stored once as a zlib-compressed blob named after the SHA-256
+    of its content, so a snapshot only writes the files that changed since the
+    previous one. A snapshot is a manifest mapping relative paths to blobs. Only
+    the newest `retention` snapshots are kept, blobs no longer referenced by any
+    of them are removed
+
+    All methods do blocking file I/O and are meant to be run in an executor
+    """
+
+    def __init__ (self, directory: str, retention: int, ignore: (str,) = ()):
+        self.directory = directory
+        self.retention = retention
+        self.ignore    = tuple(ignore)
+
+        self._objects   = os.path.join(directory, 'objects')
+        self._snapshots = os.path.join(directory, 'snapshots')
+
+        os.makedirs(self._objects, exist_ok = True)
+        os.makedirs(self._snapshots, exist_ok = True)
+
+    def _blob_path (self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], digest)
+
+    def _manifest_path (self, snapshot_id: str) -> str:
+        return os.path.join(self._snapshots, f'{snapshot_id}.json')
+
+    def _read_manifest (self, snapshot_id: str) -> dict:
+        with open(self._manifest_path(snapshot_id), 'r', encoding = 'utf-8') as f:
+            return json.loads(f.read())
+
+    def _walk (self, source: str):
+        for root, _, files in os.walk(source):
+            for file in files:
+                path = os.path.join(root, file)
+                name = os.path.relpath(path, source).replace(os.sep, '/')
+
+                if not name.endswith(self.ignore):
+                    yield name, path
+
+    def _store_blob (self, path: str) -> str:
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        digest    = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(digest)
+
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok = True)
+            temp_path = f'{blob_path}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(content))
+            os.replace(temp_path, blob_path)
+
+        return digest
+
+    def list (self) -> [str]:
+        """Returns the snapshot IDs, newest first"""
+
+        return sorted((file[:-5] for file in os.listdir(self._snapshots) if file.endswith('.json')), reverse = True)
+
+    def info (self, snapshot_id: str) -> dict:
+        return self._read_manifest(snapshot_id)
+
+    def create (self, source: str) -> (str, int):
+        """
+        Takes a snapshot of source
+
+        Files whose size and modification time match the previous snapshot are
+        not read again. Returns the snapshot ID and the number of files that changed
+        """
+
+        snapshots = self.list()
+        previous  = self._read_manifest(snapshots[0])['files'] if snapshots else {}
+
+        files   = {}
+        changed = 0
+
+        for name, path in self._walk(source):
+            stat  = os.stat(path)
+            entry = previous.get(name)
+
+            if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                files[name] = entry
+                continue
+
+            digest = self._store_blob(path)
+
+            if entry is None or entry['sha256'] != digest:
+                changed += 1
+
+            files[name] = {
+                'sha256': digest,
+                'size'  : stat.st_size,
+                'mtime' : stat.st_mtime_ns
+            }
+
+        snapshot_id = datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        atomic_write_json(self._manifest_path(snapshot_id), {'created': snapshot_id, 'files': files})
+
+        self.prune()
+        return snapshot_id, changed
+
+    def prune (self) -> int:
+        """Removes snapshots beyond the retention limit and unreferenced blobs, returns the number of blobs removed"""
+
+        snapshots = self.list()
+
+        for snapshot_id in snapshots[self.retention:]:
+            os.remove(self._manifest_path(snapshot_id))
+
+        referenced = set()
+        for snapshot_id in snapshots[:self.retention]:
+            referenced.update(entry['sha256'] for entry in self._read_manifest(snapshot_id)['files'].values())
+
+        removed = 0
+        for root, _, files in os.walk(self._objects):
+            for file in files:
+                if file not in referenced:
+                    os.remove(os.path.join(root, file))
+                    removed += 1
+
+        return removed
+
+    def restore (self, snapshot_id: str, target: str) -> (int, int):
+        """
+        Restores the files of a snapshot into target
+
+        Files in target that are not in the snapshot, other than ignored ones,
+        are removed, so that target holds the snapshot and not a mix of it and
+        newer files. Returns the number of files restored and removed
+        """
+
+        files = self._read_manifest(snapshot_id)['files']
+
+        for name, entry in files.items():
+            with open(self._blob_path(entry['sha256']), 'rb') as f:
+                content = zlib.decompress(f.read())
+
+            path = os.path.join(target, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+
+            temp_path = f'{path}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+
+        removed = 0
+        for name, path in list(self._walk(target)):
+            if name not in files:
+                os.remove(path)
+                removed += 1
+
+        return len(files), removed
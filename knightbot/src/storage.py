@@ -0,0 +1,309 @@
+"""
+storage.py
+"""
+
+import json
+import os
+import sqlite3
+
+from abc import (
+    abstractmethod
+)
+from collections.abc import (
+    MutableMapping
+)
+from persistence import (
+    atomic_write_json
+)
+
+# Marks a pending delete in SQLiteStorage
+_DELETED = object()
+
+class Codec:
+    """
+    Converts the entries of a cache file between their stored and in-memory forms
+
+    Stored keys are strings and stored values are JSON compatible. The default
+    codec keeps entries as they are stored
+    """
+
+    @staticmethod
+    def decode_key (key: str):
+        return key
+
+    @staticmethod
+    def encode_key (key) -> str:
+        return key
+
+    @staticmethod
+    def decode (key, value):
+        return value
+
+    @staticmethod
+    def encode (value):
+        return value
+
+class _Storage:
+    """Base class for the backends that persist Knight.cache"""
+
+    @abstractmethod
+    def load (self, table: 'CacheTable') -> dict:
+        """Returns the stored entries of a cache file"""
+        raise Exception('Implementation of _Storage.load() not found')
+
+    @abstractmethod
+    def upsert (self, table: 'CacheTable', key, value) -> None:
+        raise Exception('Implementation of _Storage.upsert() not found')
+
+    @abstractmethod
+    def delete (self, table: 'CacheTable', key) -> None:
+        raise Exception('Implementation of _Storage.delete() not found')
+
+    def collect (self):
+        """
+        Takes the changes made since the last call
+
+        Runs on the event loop, the result is handed to write() which may run
+        on another thread. Returns None if nothing has changed
+        """
+        return None
+
+    def write (self, changes) -> None:
+        pass
+
+    def requeue (self, changes) -> None:
+        """Puts collected changes that could not be written back, changes made since take precedence"""
+        pass
+
+    def flush (self) -> None:
+        """Writes pending changes on the calling thread"""
+
+        changes = self.collect()
+        if changes is not None:
+            self.write(changes)
+
+    def checkpoint (self) -> None:
+        """Makes the files in the cache directory self-contained so they can be copied"""
+        pass
+
+    def close (self) -> None:
+        pass
+
+class JSONStorage (_Storage):
+    """
+    Stores every cache file as a JSON document in the cache directory
+
+    Changes only mark a file as modified, only modified files are rewritten
+    """
+
+    def __init__ (self, directory: str):
+        self.directory = directory
+
+        self._tables   = {}
+        self._modified = set()
+
+    def _path (self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load (self, table: 'CacheTable') -> dict:
+        path = self._path(table.name)
+
+        if not os.path.exists(path):
+            with open(path, 'w', encoding = 'utf-8') as f:
+                f.write('{}')
+
+        with open(path, 'r', encoding = 'utf-8') as f:
+            content = json.loads(f.read())
+
+        self._tables[table.name] = table
+        return content
+
+    def upsert (self, table: 'CacheTable', key, value) -> None:
+        self._modified.add(table.name)
+
+    def delete (self, table: 'CacheTable', key) -> None:
+        self._modified.add(table.name)
+
+    def collect (self) -> list:
+        if not self._modified:
+            return None
+
+        # Records are never modified in place, a changed copy is assigned
+        # instead (see GuildConfig), so a shallow copy is a stable snapshot
+        changes = [(self._path(name), self._tables[name], self._tables[name].snapshot()) for name in self._modified]
+        self._modified.clear()
+        return changes
+
+    def write (self, changes: list) -> None:
+        for path, table, snapshot in changes:
+            atomic_write_json(path, table.encode(snapshot))
+
+    def requeue (self, changes: list) -> None:
+        # The files are written again from the current entries
+        self._modified.update(table.name for _, table, _ in changes)
+
+class SQLiteStorage (_Storage):
+    """
+    Stores every cache entry as a row of a single SQLite database in WAL mode
+
+    Writes touch only the rows of the entries that changed, so their cost does
+    not depend on how many entries a cache file holds. Changes to the same
+    entry between two writes are collapsed into one
+    """
+
+    def __init__ (self, path: str):
+        self.path = path
+
+        self._pending = {}
+
+        # write() runs on executor threads, calls never overlap
+        self._connection = sqlite3.connect(path, isolation_level = None, check_same_thread = False)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                name  TEXT NOT NULL,
+                key   TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (name, key)
+            ) WITHOUT ROWID
+        ''')
+
+        # Cache files that have been imported by migrate()
+        self._connection.execute('CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def load (self, table: 'CacheTable') -> dict:
+        rows = self._connection.execute('SELECT key, value FROM cache WHERE name = ?', (table.name,))
+        return {key: json.loads(value) for key, value in rows}
+
+    def upsert (self, table: 'CacheTable', key, value) -> None:
+        self._pending[(table.name, key)] = (table.codec, value)
+
+    def delete (self, table: 'CacheTable', key) -> None:
+        self._pending[(table.name, key)] = (table.codec, _DELETED)
+
+    def collect (self) -> dict:
+        if not self._pending:
+            return None
+
+        changes, self._pending = self._pending, {}
+        return changes
+
+    def write (self, changes: dict) -> None:
+        upserts = []
+        deletes = []
+
+        for (name, key), (codec, value) in changes.items():
+            if value is _DELETED:
+                deletes.append((name, codec.encode_key(key)))
+            else:
+                upserts.append((name, codec.encode_key(key), json.dumps(codec.encode(value))))
+
+        with self._connection:
+            self._connection.execute('BEGIN')
+            self._connection.executemany('''
+                INSERT INTO cache (name, key, value) VALUES (?, ?, ?)
+                ON CONFLICT (name, key) DO UPDATE SET value = excluded.value
+            ''', upserts)
+            self._connection.executemany('DELETE FROM cache WHERE name = ? AND key = ?', deletes)
+
+    def requeue (self, changes: dict) -> None:
+        merged = dict(changes)
+        merged.update(self._pending)
+        self._pending = merged
+
+    def migrate (self, name: str, path: str) -> int:
+        """
+        Imports a JSON cache file into the database
+
+        A file is imported once, the import is recorded in the migrations table.
+        Otherwise a table emptied later, e.g. by removing the last guild, would
+        be filled again from the stale file on the next start. A file whose
+        entries are already in the database, from before imports were
+        recorded, is recorded without importing it. Safe to call on every
+        start. Returns the number of entries imported
+        """
+
+        if self._connection.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone() is not None:
+            return 0
+
+        if not os.path.exists(path):
+            return 0
+
+        imported = self._connection.execute('SELECT 1 FROM cache WHERE name = ? LIMIT 1', (name,)).fetchone() is not None
+        content  = {}
+
+        if not imported:
+            with open(path, 'r', encoding = 'utf-8') as f:
+                content = json.loads(f.read())
+
+        with self._connection:
+            self._connection.execute('BEGIN')
+            self._connection.executemany('INSERT INTO cache (name, key, value) VALUES (?, ?, ?)',
+                                         ((name, key, json.dumps(value)) for key, value in content.items()))
+            self._connection.execute('INSERT INTO migrations (name) VALUES (?)', (name,))
+
+        return len(content)
+
+    def checkpoint (self) -> None:
+        self._connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close (self) -> None:
+        self.flush()
+        self._connection.close()
+
+class CacheTable (MutableMapping):
+    """
+    Dict-like view of a single cache file
+
+    Entries are held in memory in the form given by the codec and converted to
+    their stored form only when written. Assigning or deleting a key is passed
+    on to the storage backend. Values are not watched for changes and may be
+    encoded on another thread while they are written, so an entry is changed
+    by assigning a modified copy, never in place
+    """
+
+    def __init__ (self, name: str, storage: _Storage, codec: Codec = Codec):
+        self.name     = name
+        self.codec    = codec
+        self._storage = storage
+        self._data    = {}
+
+        for key, value in storage.load(self).items():
+            key = codec.decode_key(key)
+            self._data[key] = codec.decode(key, value)
+
+    def __getitem__ (self, key):
+        return self._data[key]
+
+    def __setitem__ (self, key, value) -> None:
+        self._data[key] = value
+        self._storage.upsert(self, key, value)
+
+    def __delitem__ (self, key) -> None:
+        del self._data[key]
+        self._storage.delete(self, key)
+
+    def __iter__ (self):
+        return iter(self._data)
+
+    def __len__ (self) -> int:
+        return len(self._data)
+
+    def __contains__ (self, key) -> bool:
+        return key in self._data
+
+    def get (self, key, default = None):
+        return self._data.get(key, default)
+
+    def snapshot (self) -> dict:
+        return dict(self._data)
+
+    def encode (self, entries: dict) -> dict:
+        """Converts entries to their stored form, safe to call from another thread on a snapshot"""
+
+        codec = self.codec
+        return {codec.encode_key(key): codec.encode(value) for key, value in entries.items()}
+
+    def to_dict (self) -> dict:
+        return self.encode(self._data)
@@ -0,0 +1,137 @@
+"""
+transcript.py
+"""
+
+import json
+import os
+import tempfile
+
+from discord import (
+    Message
+)
+from discord.utils import (
+    snowflake_time
+)
+from messagestore import (
+    StoredMessage
+)
+
+class TranscriptWriter:
+    """
+    Writes deleted messages to a transcript file one at a time
+
+    Every message is written as soon as it is added, through a buffered file
+    handle, so a transcript of any length needs the memory of a single message.
+    The file is written as `name`.tmp in `directory` and renamed to `name`
+    when the writer is closed. Messages are written as text blocks or, with
+    `format = 'jsonl'`, as JSON objects with author, timestamp, content,
+    attachment and embed keys
+
+    Messages known only from the MessageStore are written with what it keeps,
+    messages that were not cached at all with their ID and time only
+    """
+
+    FORMATS = ('text', 'jsonl')
+
+    def __init__ (self, directory: str, name: str, format: str = 'text'):
+        if format not in self.FORMATS:
+            raise Exception(f'Unknown transcript format "{format}", expected one of {", ".join(self.FORMATS)}')
+
+        os.makedirs(directory, exist_ok = True)
+
+        self.path   = os.path.join(directory, f'{name}.{"txt" if format == "text" else "jsonl"}')
+        self.format = format
+        self.count  = 0
+
+        descriptor, self._temp_path = tempfile.mkstemp(dir = directory, prefix = f'{name}-', suffix = '.tmp')
+        self._handle = open(descriptor, 'w', encoding = 'utf-8', buffering = 1 << 16)
+
+    def __enter__ (self) -> 'TranscriptWriter':
+        return self
+
+    def __exit__ (self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @staticmethod
+    def _record (message: Message) -> dict:
+        return {
+            'id'         : message.id,
+            'author'     : f'{message.author.name}#{message.author.discriminator}',
+            'author_id'  : message.author.id,
+            'timestamp'  : message.created_at.isoformat() + 'Z',
+            'content'    : message.content,
+            'attachments': [{'filename': attachment.filename, 'url': attachment.url, 'size': attachment.size}
+                            for attachment in message.attachments],
+            'embeds'     : [embed.to_dict() for embed in message.embeds]
+        }
+
+    @staticmethod
+    def _stored_record (message: StoredMessage) -> dict:
+        return {
+            'id'         : message.id,
+            'author'     : message.author,
+            'author_id'  : message.author_id,
+            'timestamp'  : message.created_at.isoformat() + 'Z',
+            'content'    : message.content,
+            'attachments': [{'filename': url.rsplit('/', 1)[-1], 'url': url, 'size': None}
+                            for url in message.attachments or ()],
+            'embeds'     : []
+        }
+
+    @staticmethod
+    def _missing_record (message_id: int) -> dict:
+        return {
+            'id'         : message_id,
+            'author'     : None,
+            'author_id'  : None,
+            'timestamp'  : snowflake_time(message_id).isoformat() + 'Z',
+            'content'    : None,
+            'attachments': [],
+            'embeds'     : []
+        }
+
+    @staticmethod
+    def _text (record: dict) -> str:
+        if record['author'] is None:
+            return f'[{record["timestamp"]}] message {record["id"]}\nContent not cached\n\n'
+
+        lines = [f'[{record["timestamp"]}] {record["author"]} ({record["author_id"]}) - message {record["id"]}']
+
+        if len(record['content']) > 0:
+            lines.append(record['content'])
+        for attachment in record['attachments']:
+            size = '' if attachment['size'] is None else f' ({attachment["size"]} bytes)'
+            lines.append(f'Attachment: {attachment["filename"]}{size} {attachment["url"]}')
+        for embed in record['embeds']:
+            lines.append(f'Embed: {embed.get("title", "")} {embed.get("description", "")}'.rstrip())
+
+        return '\n'.join(lines) + '\n\n'
+
+    def write (self, message: Message) -> None:
+        self._write(self._record(message))
+
+    def write_stored (self, message: StoredMessage) -> None:
+        self._write(self._stored_record(message))
+
+    def write_missing (self, message_id: int) -> None:
+        self._write(self._missing_record(message_id))
+
+    def _write (self, record: dict) -> None:
+        if self.format == 'jsonl':
+            self._handle.write(json.dumps(record) + '\n')
+        else:
+            self._handle.write(self._text(record))
+
+        self.count += 1
+
+    def close (self) -> None:
+        """Writes what is buffered and moves the transcript to its final path"""
+
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+            os.replace(self._temp_path, self.path)
+
+    @property
+    def size (self) -> int:
+        return os.path.getsize(self.path)